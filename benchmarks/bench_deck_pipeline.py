@@ -0,0 +1,157 @@
+"""
+Headless benchmarks for the deck import and export hot paths.
+
+Runs against a real temporary anki.collection.Collection, with aqt stubbed out:
+
+    import  deck_initializer.from_json + Deck.save_metadata + Deck.save_decks_and_notes (new notes)
+    update  the same payload again, i.e. every note already exists (the daily subscriber pull)
+    export  deck_initializer.from_collection + JSON serialization (the suggest/publish path)
+
+Each size runs in its own process so peak RSS is per size. SQL queries are the
+db_* calls into the rust backend, "backend" counts every backend call. Requires the
+`anki` (23.12, later releases dropped anki.exporting.AnkiExporter), `pyfunctional`,
+`pygtrie` and `pyyaml` packages:
+
+    python benchmarks/bench_deck_pipeline.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import fake_aqt
+from synthetic_deck import make_deck_json
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SQL_BACKEND_METHODS = {"db_query", "db_execute_many", "db_begin", "db_commit", "db_rollback"}
+
+
+class CountingBackend:
+    """Wraps the rust backend and counts calls per method."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._backend, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_size(note_count):
+    fake_aqt.install()
+    from anki.collection import Collection
+
+    deck_initializer = fake_aqt.import_plugin_module("crowd_anki.representation.deck_initializer")
+    deck_module = fake_aqt.import_plugin_module("crowd_anki.representation.deck")
+    import_dialog = fake_aqt.import_plugin_module("crowd_anki.importer.import_dialog")
+
+    results = {"notes": note_count}
+    with tempfile.TemporaryDirectory() as tmp:
+        collection = Collection(os.path.join(tmp, "collection.anki2"))
+        counter = CountingBackend(collection._backend)
+        collection._backend = counter
+        collection.db._backend = counter
+        fake_aqt.fake_mw.col = collection
+
+        payload = json.dumps(make_deck_json(collection, note_count))
+        results["payload_mb"] = round(len(payload) / (1024 * 1024), 2)
+
+        import_config = import_dialog.ImportConfig(
+            add_tag_to_cards=[], use_notes=True, use_media=False, ignore_deck_movement=False
+        )
+        # Set by the AnkiCollab import (import_manager.prep_config), not by the CrowdAnki dialog
+        import_config.optional_tags = []
+        import_config.has_optional_tags = True
+        import_config.selected_optional_tags = lambda: frozenset(import_config.optional_tags)
+
+        def measure(phase, function):
+            counter.calls.clear()
+            start = time.perf_counter()
+            value = function()
+            results[phase] = {
+                "seconds": round(time.perf_counter() - start, 3),
+                "sql_queries": sum(count for name, count in counter.calls.items() if name in SQL_BACKEND_METHODS),
+                "backend_calls": sum(counter.calls.values()),
+            }
+            return value
+
+        def import_payload():
+            deck = deck_initializer.from_json(json.loads(payload))
+            deck.save_metadata(collection)
+            deck.save_decks_and_notes(collection=collection,
+                                      parent_name="",
+                                      model_map_cache=defaultdict(dict),
+                                      import_config=import_config)
+            return deck
+
+        root = measure("import", import_payload)
+        measure("update", import_payload)
+
+        def export_deck():
+            deck = deck_initializer.from_collection(collection, root.anki_dict["name"])
+            return json.dumps(deck, default=deck_module.Deck.default_json, sort_keys=True, indent=4, ensure_ascii=False)
+
+        measure("export", export_deck)
+        results["collection_notes"] = collection.note_count()
+        collection.close()
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return results
+
+
+def report(all_results):
+    print(f"{'notes':>8} {'phase':>7} {'seconds':>9} {'sql':>9} {'backend':>9} {'rss MB':>8}")
+    for results in all_results:
+        for phase in ("import", "update", "export"):
+            phase_results = results[phase]
+            print(f"{results['notes']:>8} {phase:>7} {phase_results['seconds']:>9} "
+                  f"{phase_results['sql_queries']:>9} {phase_results['backend_calls']:>9} "
+                  f"{results['peak_rss_mb']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="note counts to benchmark")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON lines")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        print(json.dumps(run_size(args.single)))
+        return
+
+    all_results = []
+    for size in args.sizes:
+        output = subprocess.run([sys.executable, __file__, "--single", str(size)],
+                                check=True, capture_output=True, text=True).stdout
+        all_results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        for results in all_results:
+            print(json.dumps(results))
+    else:
+        report(all_results)
+
+
+if __name__ == "__main__":
+    main()
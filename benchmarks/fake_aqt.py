@@ -0,0 +1,128 @@
+"""
+Just enough of `aqt` to import the add-on's deck pipeline without a running Anki.
+
+Everything Qt or main-window related is replaced by permissive stubs, while
+`anki` (the collection, notes, models, media) stays the real library.
+"""
+
+import importlib
+import importlib.abc
+import importlib.machinery
+import re
+import sys
+import types
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PLUGIN_PACKAGE = "plugin_source"
+
+
+class _StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Stub
+
+
+class Stub(metaclass=_StubMeta):
+    """Accepts any construction, attribute access and call."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Stub()
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+    def __bool__(self):
+        return False
+
+
+class _StubModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Stub
+
+
+class _StubFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Serves a _StubModule for `aqt` and every `aqt.*` submodule."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname == "aqt" or fullname.startswith("aqt."):
+            return importlib.machinery.ModuleSpec(fullname, self, is_package=True)
+        return None
+
+    def create_module(self, spec):
+        module = _StubModule(spec.name)
+        module.__path__ = []
+        return module
+
+    def exec_module(self, module):
+        parent, _, child = module.__name__.rpartition(".")
+        if parent:
+            setattr(sys.modules[parent], child, module)
+
+
+def _qt_names():
+    """The Qt names the add-on takes from `from aqt.qt import *`, which a stub module can't provide by itself."""
+    names = set()
+    for path in REPO_ROOT.joinpath(PLUGIN_PACKAGE).rglob("*.py"):
+        names.update(re.findall(r"\b(?:Q[A-Z]\w*|pyqt\w+|qconnect)\b", path.read_text(encoding="utf8")))
+    return sorted(names)
+
+
+def _config(_module_name):
+    return {"settings": {"token": "", "auto_approve": False, "pull_on_startup": False, "profiling": False}}
+
+
+fake_mw = SimpleNamespace(
+    addonManager=SimpleNamespace(getConfig=_config, writeConfig=lambda *args: None),
+    pm=SimpleNamespace(name="benchmark", set_last_addon_update_check=lambda *args: None),
+    form=Stub(),
+    taskman=SimpleNamespace(run_on_main=lambda closure: closure()),
+    progress=Stub(),
+    col=None,
+)
+
+
+def install(bare_package=True):
+    """
+    Register the stub aqt modules and, unless `bare_package` is False, a bare add-on package
+    (without running its __init__).
+    """
+    sys.meta_path.insert(0, _StubFinder())
+    import aqt
+    import aqt.qt
+    aqt.mw = fake_mw
+    aqt.qt.qtmajor = 6
+    aqt.qt.__all__ = _qt_names()
+    for name in aqt.qt.__all__:
+        setattr(aqt.qt, name, Stub)
+
+    # Importing the add-on package would run main.py, which builds menus on the main window
+    if bare_package:
+        for name, path in ((PLUGIN_PACKAGE, REPO_ROOT.joinpath(PLUGIN_PACKAGE)),
+                           (f"{PLUGIN_PACKAGE}.crowd_anki", REPO_ROOT.joinpath(PLUGIN_PACKAGE, "crowd_anki"))):
+            package = types.ModuleType(name)
+            package.__path__ = [str(path)]
+            sys.modules[name] = package
+    else:
+        sys.path.insert(0, str(REPO_ROOT))
+
+    sys.path.insert(0, str(REPO_ROOT.joinpath(PLUGIN_PACKAGE, "dist")))
+
+    # The add-on imports Collection from the package root, which the standalone anki wheel does not provide
+    import anki
+    import anki.collection
+    if not hasattr(anki, "Collection"):
+        anki.Collection = anki.collection.Collection
+
+
+def import_plugin_module(name):
+    return importlib.import_module(f"{PLUGIN_PACKAGE}.{name}")
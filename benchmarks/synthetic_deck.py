@@ -0,0 +1,103 @@
+"""Synthetic CrowdAnki deck JSON, shaped like the payloads subscribers receive from AnkiCollab."""
+
+import copy
+import random
+import uuid
+
+# (name, field count): different widths exercise per-field work in the import
+NOTE_MODELS = (("Bench Basic", 2), ("Bench Extended", 3), ("Bench Wide", 5))
+SUBDECKS = 8
+SUBSUBDECKS = 3
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=1))
+
+
+def _guid(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789") for _ in range(10))
+
+
+def make_note_model(collection, name, field_count, rng):
+    """A full legacy notetype dict, built through the collection so it has every key Anki expects."""
+    models = collection.models
+    model = models.new(name)
+    for i in range(field_count):
+        models.add_field(model, models.new_field(f"Field {i + 1}"))
+    template = models.new_template("Card 1")
+    template["qfmt"] = "{{Field 1}}<img src=\"_bench_logo.png\">"
+    template["afmt"] = "{{FrontSide}}<hr id=answer>" + "".join(f"{{{{Field {i + 1}}}}}" for i in range(1, field_count))
+    models.add_template(model, template)
+    model["css"] = ".card { background: url('_bench_background.png'); }"
+    model["crowdanki_uuid"] = _uuid(rng)
+    for key in ("id", "mod", "usn"):
+        model.pop(key, None)
+    return model
+
+
+def _note(number, model, rng):
+    field_count = len(model["flds"])
+    fields = [f"Question {number} <b>{rng.random():.6f}</b>"]
+    fields += [f"Answer {number} " + "lorem ipsum " * rng.randint(1, 20) for _ in range(field_count - 1)]
+    media = []
+    if number % 3 == 0:
+        media.append(f"bench_{number}.jpg")
+        fields[-1] += f"<img src=\"bench_{number}.jpg\">"
+    if number % 7 == 0:
+        media.append(f"bench_{number}.mp3")
+        fields[0] += f"[sound:bench_{number}.mp3]"
+    note = {
+        "__type__": "Note",
+        "data": "",
+        "fields": fields,
+        "flags": 0,
+        "guid": _guid(rng),
+        "note_model_uuid": model["crowdanki_uuid"],
+        "tags": [f"bench::tag{number % 50}"] + (["AnkiCollab_Optional::extra"] if number % 10 == 0 else []),
+    }
+    return note, media
+
+
+def _deck(name, rng):
+    return {
+        "__type__": "Deck",
+        "children": [],
+        "crowdanki_uuid": _uuid(rng),
+        "desc": "",
+        "dyn": 0,
+        "extendNew": 10,
+        "extendRev": 50,
+        "media_files": [],
+        "name": name,
+        "notes": [],
+    }
+
+
+def make_deck_json(collection, note_count, seed=1):
+    """
+    Root deck with SUBDECKS children of SUBSUBDECKS children each. Notes are spread
+    round-robin over all decks and note models, about every third note references media.
+    """
+    rng = random.Random(seed)
+    models = [make_note_model(collection, name, fields, rng) for name, fields in NOTE_MODELS]
+
+    root = _deck("AnkiCollab Benchmark", rng)
+    root["note_models"] = copy.deepcopy(models)
+    root["deck_configurations"] = []
+    decks = [root]
+    for i in range(SUBDECKS):
+        child = _deck(f"Chapter {i + 1}", rng)
+        root["children"].append(child)
+        decks.append(child)
+        for j in range(SUBSUBDECKS):
+            grandchild = _deck(f"Section {i + 1}.{j + 1}", rng)
+            child["children"].append(grandchild)
+            decks.append(grandchild)
+
+    for number in range(note_count):
+        deck = decks[number % len(decks)]
+        note, media = _note(number, models[number % len(models)], rng)
+        deck["notes"].append(note)
+        deck["media_files"].extend(media)
+
+    return root
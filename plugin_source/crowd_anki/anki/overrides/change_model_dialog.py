@@ -9,12 +9,14 @@ class ChangeModelDialog(QDialog):
     """
     Dialog that allows user to create field and template maps from one note model to another
     Extrated from main Anki codebase, largely untouched.
+    With apply_change=False it only collects the maps (get_field_map/get_template_map) and leaves the notes alone.
     """
 
-    def __init__(self, collection, note_id_list, old_model=None, parent=None):
+    def __init__(self, collection, note_id_list, old_model=None, parent=None, apply_change=True):
         QDialog.__init__(self, parent)
         self.collection = collection
         self.note_id_list = note_id_list
+        self.apply_change = apply_change
         self.old_model = old_model
         if self.old_model is None:
             first_note = Note(collection, id=note_id_list[0])
@@ -160,13 +162,14 @@ class ChangeModelDialog(QDialog):
         field_map = self.get_field_map()
         templates_map = self.get_template_map()
         if any(True for template in list(templates_map.values()) if template is None) and \
-                not aqt.utils.askUser(_(
+                not aqt.utils.askUser(
                     "Any cards mapped to nothing will be deleted. "
                     "If a note has no remaining cards, it will be lost. "
-                    "Are you sure you want to continue?")):
+                    "Are you sure you want to continue?"):
                 return
 
-        self.collection.models.change(self.old_model, self.note_id_list, self.targetModel, field_map, templates_map)
+        if self.apply_change:
+            self.collection.models.change(self.old_model, self.note_id_list, self.targetModel, field_map, templates_map)
 
         self.cleanup()
 
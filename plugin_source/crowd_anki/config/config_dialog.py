@@ -54,6 +54,12 @@ class ConfigDialog(QDialog):
         self.form.cb_create_deck_subdirectory.setChecked(self.config.export_create_deck_subdirectory)
         self.form.cb_create_deck_subdirectory.stateChanged.connect(self.toggle_create_deck_subdirectory)
 
+        self.form.cb_sharded_export.setChecked(self.config.export_sharded_decks)
+        self.form.cb_sharded_export.stateChanged.connect(self.toggle_sharded_export)
+
+        self.form.cb_remove_stale_media.setChecked(self.config.export_remove_stale_media)
+        self.form.cb_remove_stale_media.stateChanged.connect(self.toggle_remove_stale_media)
+
         self.form.textedit_deck_sort_methods.appendPlainText(list_to_cs_string(self.config.export_note_sort_methods))
         self.form.textedit_deck_sort_methods.textChanged.connect(self.changed_textedit_deck_sort_methods)
 
@@ -70,6 +76,12 @@ class ConfigDialog(QDialog):
     def toggle_create_deck_subdirectory(self):
         self.config.export_create_deck_subdirectory = not self.config.export_create_deck_subdirectory
 
+    def toggle_sharded_export(self):
+        self.config.export_sharded_decks = not self.config.export_sharded_decks
+
+    def toggle_remove_stale_media(self):
+        self.config.export_remove_stale_media = not self.config.export_remove_stale_media
+
     def toggle_ignore_move_cards(self):
         self.config.import_notes_ignore_deck_movement = not self.config.import_notes_ignore_deck_movement
 
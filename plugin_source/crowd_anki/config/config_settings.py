@@ -31,6 +31,8 @@ class ConfigSettings:
     export_notes_reverse_order: bool
     export_note_sort_methods: list
     export_create_deck_subdirectory: bool
+    export_sharded_decks: bool
+    export_remove_stale_media: bool
     import_notes_ignore_deck_movement: bool
 
     @property
@@ -47,6 +49,8 @@ class ConfigSettings:
         EXPORT_NOTE_SORT_METHODS = ConfigEntry("export_note_sort_methods", [NoteSortingMethods.NO_SORTING.value])
         EXPORT_NOTES_REVERSE_ORDER = ConfigEntry("export_notes_reverse_order", False)
         EXPORT_CREATE_DECK_SUBDIRECTORY = ConfigEntry("export_create_deck_subdirectory", True)
+        EXPORT_SHARDED_DECKS = ConfigEntry("export_sharded_decks", False)
+        EXPORT_REMOVE_STALE_MEDIA = ConfigEntry("export_remove_stale_media", False)
         IMPORT_NOTES_IGNORE_DECK_MOVEMENT = ConfigEntry("import_notes_ignore_deck_movement", False)
 
     def __init__(self, addon_manager=None, init_values=None, profile_manager=None):
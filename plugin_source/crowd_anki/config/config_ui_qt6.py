@@ -66,6 +66,12 @@ class Ui_Dialog(object):
         self.cb_create_deck_subdirectory = QtWidgets.QCheckBox(self.group_deck_export)
         self.cb_create_deck_subdirectory.setObjectName("cb_create_deck_subdirectory")
         self.verticalLayout_4.addWidget(self.cb_create_deck_subdirectory)
+        self.cb_sharded_export = QtWidgets.QCheckBox(self.group_deck_export)
+        self.cb_sharded_export.setObjectName("cb_sharded_export")
+        self.verticalLayout_4.addWidget(self.cb_sharded_export)
+        self.cb_remove_stale_media = QtWidgets.QCheckBox(self.group_deck_export)
+        self.cb_remove_stale_media.setObjectName("cb_remove_stale_media")
+        self.verticalLayout_4.addWidget(self.cb_remove_stale_media)
         self.verticalLayout_2.addWidget(self.group_deck_export)
         self.horizontalLayout.addLayout(self.verticalLayout_2)
         self.tb_instructions = QtWidgets.QTextBrowser(Dialog)
@@ -97,6 +103,8 @@ class Ui_Dialog(object):
         self.lbl_deck_sort.setText(_translate("Dialog", "Deck Sort Method(s) (separated by comma)"))
         self.cb_reverse_sort.setText(_translate("Dialog", "Reverse Sort Order"))
         self.cb_create_deck_subdirectory.setText(_translate("Dialog", "Create directory on manual export"))
+        self.cb_sharded_export.setText(_translate("Dialog", "Write the notes of each subdeck to a separate file"))
+        self.cb_remove_stale_media.setText(_translate("Dialog", "Remove media files the deck no longer uses"))
         self.tb_instructions.setHtml(_translate("Dialog", "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0//EN\" \"http://www.w3.org/TR/REC-html40/strict.dtd\">\n"
 "<html><head><meta name=\"qrichtext\" content=\"1\" /><style type=\"text/css\">\n"
 "p, li { white-space: pre-wrap; }\n"
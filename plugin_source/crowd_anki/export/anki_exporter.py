@@ -1,7 +1,6 @@
 import json
 import os
 
-import shutil
 from pathlib import Path
 from typing import Callable
 
@@ -10,10 +9,12 @@ from .deck_exporter import DeckExporter
 from ..anki.adapters.anki_deck import AnkiDeck
 from ..representation import deck_initializer
 from ..representation.deck import Deck
-from ..utils.constants import DECK_FILE_NAME, DECK_FILE_EXTENSION, MEDIA_SUBDIRECTORY_NAME
+from ..utils.constants import DECK_FILE_NAME, DECK_FILE_EXTENSION, MEDIA_SUBDIRECTORY_NAME, \
+    DECK_SHARDS_SUBDIRECTORY_NAME
 from ..utils.filesystem.name_sanitizer import sanitize_anki_deck_name
 from .note_sorter import NoteSorter
 from ..config.config_settings import ConfigSettings
+from ...media_ingest import IngestResult, MediaCopier, ingest, main_window_progress
 
 
 class AnkiJsonExporter(DeckExporter):
@@ -41,12 +42,15 @@ class AnkiJsonExporter(DeckExporter):
         self.last_exported_count = deck.get_note_count()
 
         deck_filename = deck_directory.joinpath(self.deck_file_name).with_suffix(DECK_FILE_EXTENSION)
+        if self.config.export_sharded_decks:
+            deck_json, written_shards = self._write_shards(deck, deck_directory)
+        else:
+            deck_json, written_shards = deck, set()
+        self._remove_stale_shards(deck_directory, deck_filename, written_shards)
+
         with deck_filename.open(mode='w', encoding="utf8") as deck_file:
-            deck_file.write(json.dumps(deck,
-                                       default=Deck.default_json,
-                                       sort_keys=True,
-                                       indent=4,
-                                       ensure_ascii=False))
+            # json.dump writes the encoded chunks as they are produced, instead of building one huge string
+            self._dump(deck_json, deck_file)
 
         self._save_changes(deck)
 
@@ -55,6 +59,66 @@ class AnkiJsonExporter(DeckExporter):
 
         return deck_directory
 
+    @staticmethod
+    def _dump(value, file):
+        json.dump(value, file,
+                  default=Deck.default_json,
+                  sort_keys=True,
+                  indent=4,
+                  ensure_ascii=False)
+
+    def _write_shards(self, deck, deck_directory):
+        """
+        Write the notes of every deck to its own file, one deck at a time. Returns the deck tree
+        without the notes, which becomes the index, and the written shards. A deck's shard is
+        named after its uuid, so it stays the same file across exports.
+        """
+        shards_directory = deck_directory.joinpath(DECK_SHARDS_SUBDIRECTORY_NAME)
+        shards_directory.mkdir(parents=True, exist_ok=True)
+        written = set()
+
+        def write(current_deck):
+            deck_json = current_deck.flatten()
+            shard_name = current_deck.get_uuid() + DECK_FILE_EXTENSION
+            with shards_directory.joinpath(shard_name).open(mode='w', encoding="utf8") as shard_file:
+                self._dump(deck_json.pop("notes"), shard_file)
+            notes_file = f"{DECK_SHARDS_SUBDIRECTORY_NAME}/{shard_name}"
+            written.add(notes_file)
+
+            deck_json["notes_file"] = notes_file
+            deck_json["note_count"] = len(current_deck.notes)
+            deck_json["children"] = [write(child) for child in current_deck.children]
+            return deck_json
+
+        return write(deck), written
+
+    @staticmethod
+    def _remove_stale_shards(deck_directory, deck_filename, keep):
+        """
+        Remove the shards of the previous export that were not written again, e.g. of deleted subdecks.
+        Only files listed in the previous index are removed.
+        """
+        if not deck_directory.joinpath(DECK_SHARDS_SUBDIRECTORY_NAME).is_dir() or not deck_filename.exists():
+            return
+        try:
+            with deck_filename.open(encoding="utf8") as deck_file:
+                previous_index = json.load(deck_file)
+        except ValueError:
+            return
+
+        def stale_shards(deck_json):
+            notes_file = deck_json.get("notes_file")
+            if notes_file and notes_file not in keep and Path(notes_file).parent == Path(DECK_SHARDS_SUBDIRECTORY_NAME):
+                yield notes_file
+            for child in deck_json.get("children", []):
+                yield from stale_shards(child)
+
+        for shard in stale_shards(previous_index):
+            try:
+                deck_directory.joinpath(shard).unlink()
+            except OSError as error:
+                print("Failed to remove the stale deck file {}. Full error: {}".format(shard, error))
+
     def _save_changes(self, deck, is_export_child=False):
         """Save updates that were made during the export. E.g. UUID fields
 
@@ -81,14 +145,35 @@ class AnkiJsonExporter(DeckExporter):
 
         # Notes?
 
-    def _copy_media(self, deck, deck_directory):
+    def _copy_media(self, deck, deck_directory) -> IngestResult:
+        """
+        Bring the export's media folder up to date: files that are already there with the same
+        content are skipped, the others are copied in parallel.
+        """
         media_directory = deck_directory.joinpath(MEDIA_SUBDIRECTORY_NAME)
 
         media_directory.mkdir(parents=True, exist_ok=True)
 
-        for file_src in deck.get_media_file_list():
-            try:
-                shutil.copy(os.path.join(self.collection.media.dir(), file_src),
-                            str(media_directory.resolve()))
-            except IOError as ioerror:
-                print("Failed to copy a file {}. Full error: {}".format(file_src, ioerror))
+        collection_media_directory = self.collection.media.dir()
+        export_media_directory = str(media_directory.resolve())
+        files = {file_name: os.path.join(collection_media_directory, file_name)
+                 for file_name in deck.get_media_file_list()}
+
+        result = ingest(files, export_media_directory,
+                        copier=MediaCopier.for_folders(collection_media_directory, export_media_directory),
+                        progress=main_window_progress("Exporting media: {processed} of {total} files"))
+        for file_name, error in result.failed.items():
+            print("Failed to copy a file {}. Full error: {}".format(file_name, error))
+
+        if self.config.export_remove_stale_media:
+            self._remove_stale_media(export_media_directory, files.keys())
+        return result
+
+    @staticmethod
+    def _remove_stale_media(media_directory, keep):
+        for entry in os.scandir(media_directory):
+            if entry.is_file() and entry.name not in keep:
+                try:
+                    os.remove(entry.path)
+                except OSError as error:
+                    print("Failed to remove the stale file {}. Full error: {}".format(entry.name, error))
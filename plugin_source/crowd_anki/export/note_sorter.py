@@ -1,22 +1,37 @@
 from ..config.config_settings import ConfigSettings, NoteSortingMethods
 from ..representation.deck import Deck
 
+
+def _lookup_note_type(note):
+    return note.anki_object.note_type() or {}
+
+
+def _field(index):
+    def get(note, note_type):
+        fields = note.anki_object.fields
+        # Notes of note types with fewer fields sort as if the field was empty
+        return fields[index] if index < len(fields) else ""
+    return get
+
+
 class NoteSorter:
+    # Each definition extracts one sort key from a note. `note_type(note)` returns the note's note type,
+    # looked up once per note type and sort.
     sorting_definitions = {
         # NO_SORTING is a special case which should be ignored by should_sort
         # However it's been kept here for edge cases, and for ease of testing
         # It returns 1 to ensure stable sorting, so the results will be in their previous order
-        NoteSortingMethods.NO_SORTING: lambda i: 1,
-
-        NoteSortingMethods.GUID: lambda i: i.anki_object.guid,
-        NoteSortingMethods.FLAG: lambda i: i.anki_object.flags,
-        NoteSortingMethods.TAG: lambda i: i.anki_object.tags,
-        NoteSortingMethods.NOTE_MODEL_NAME: lambda i: i.anki_object._model["name"],
-        NoteSortingMethods.NOTE_MODEL_ID: lambda i: i.anki_object._model["crowdanki_uuid"],
-        NoteSortingMethods.FIELD1: lambda i: i.anki_object.fields[0],
-        NoteSortingMethods.FIELD2: lambda i: i.anki_object.fields[1]
+        NoteSortingMethods.NO_SORTING: lambda note, note_type: 1,
+
+        NoteSortingMethods.GUID: lambda note, note_type: note.anki_object.guid,
+        NoteSortingMethods.FLAG: lambda note, note_type: note.anki_object.flags,
+        NoteSortingMethods.TAG: lambda note, note_type: tuple(note.anki_object.tags),
+        NoteSortingMethods.NOTE_MODEL_NAME: lambda note, note_type: note_type(note).get("name", ""),
+        NoteSortingMethods.NOTE_MODEL_ID: lambda note, note_type: note_type(note).get("crowdanki_uuid", ""),
+        NoteSortingMethods.FIELD1: _field(0),
+        NoteSortingMethods.FIELD2: _field(1)
     }
-    
+
     def __init__(self, config: ConfigSettings):
         self.sort_methods = config.formatted_export_note_sort_methods
         self.is_reversed = config.export_notes_reverse_order
@@ -26,13 +41,13 @@ class NoteSorter:
 
     def sort_notes(self, notes):
         if self.should_sort():
-            notes = sorted(notes, key=self.get_sort_key)
+            notes = self._sorted(notes)
 
         if self.is_reversed:
             notes = list(reversed(notes))
 
         return notes
-    
+
     def sort_deck(self, deck: Deck):
         """Sort deck and its subdecks recursively."""
         deck.notes = self.sort_notes(deck.notes)
@@ -40,11 +55,31 @@ class NoteSorter:
         for child_deck in deck.children:
             self.sort_deck(child_deck)
 
-    def get_sort_key(self, note):   
+    def _sorted(self, notes):
+        """
+        Extract every key column once, then sort the note positions by one column at a time,
+        least significant first. As the sorts are stable, that orders by all the columns.
+        """
+        notes = list(notes)
+        note_types = {}
+
+        def note_type(note):
+            mid = note.anki_object.mid
+            if mid not in note_types:
+                note_types[mid] = _lookup_note_type(note)
+            return note_types[mid]
+
+        order = list(range(len(notes)))
+        for method_name in reversed(self.sort_methods):
+            if method_name == NoteSortingMethods.NO_SORTING:
+                continue
+            key = self.sorting_definitions[method_name]
+            column = [key(note, note_type) for note in notes]
+            order.sort(key=column.__getitem__)
+        return [notes[i] for i in order]
+
+    def get_sort_key(self, note):
         return tuple(
-            key(note) 
-            for key in tuple(
-                self.sorting_definitions[method_name]
-                for method_name in self.sort_methods
-            )
+            self.sorting_definitions[method_name](note, _lookup_note_type)
+            for method_name in self.sort_methods
         )
@@ -1,6 +1,5 @@
 import json
-import os
-import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Callable, Optional
 
@@ -11,7 +10,18 @@ import yaml
 from ..representation import deck_initializer
 from ..utils.constants import DECK_FILE_NAME, DECK_FILE_EXTENSION, MEDIA_SUBDIRECTORY_NAME, IMPORT_CONFIG_NAME
 from ..importer.import_dialog import ImportDialog, ImportConfig
+from aqt.operations import QueryOp
 from aqt.qt import QDialog
+from ...media_ingest import IngestResult, MediaCopier, collect_files, ingest, main_window_progress, \
+    register_media_files
+
+# Shards of a sharded export are read concurrently
+SHARD_READ_WORKERS = 4
+
+
+def import_cancelled() -> bool:
+    """Whether the progress window of the running background stage was closed."""
+    return bool(aqt.mw) and aqt.mw.progress.want_cancel()
 
 
 class AnkiJsonImporter:
@@ -19,43 +29,101 @@ class AnkiJsonImporter:
         self.collection = collection
         self.deck_file_name = deck_file_name
 
-    def load_deck(self, directory_path) -> bool:
+    def load_deck(self, directory_path, on_done: Optional[Callable[[bool], None]] = None) -> None:
         """
         Load deck serialized to directory
         Assumes that deck json file is located in the directory
         and named 'deck.json' or '[foldername].json
+        The deck is read, written to the collection and its media copied in the background, in stages.
+        Closing the progress window cancels the import as long as no notes were written yet.
         :param directory_path: Path
+        :param on_done: called on the main thread once the import is over, with whether the deck got imported
         """
-        deck_json = self.read_deck(self.get_deck_path(directory_path))
-
-        import_config = self.read_import_config(directory_path, deck_json)
-        if import_config is None:
-            return False
 
-        if aqt.mw:
-            aqt.mw.create_backup_now()
-        try:
-            deck = deck_initializer.from_json(deck_json)
-            deck.save_to_collection(self.collection, import_config=import_config)
-
-            if import_config.use_media:
-                self.import_media(directory_path)
-        finally:
+        def finish(imported):
             if aqt.mw:
                 aqt.mw.deckBrowser.show()
-        return True
-
-    def import_media(self, directory_path):
+            if on_done:
+                on_done(imported)
+
+        def on_failure(error):
+            if isinstance(error, ValueError):
+                aqt.utils.showWarning("Error: {}. While trying to import deck from directory {}".format(
+                    error.args[0], directory_path))
+            else:
+                aqt.utils.show_exception(parent=aqt.mw, exception=error)
+            finish(False)
+
+        def run_in_background(op, success, label):
+            query_op = QueryOp(parent=aqt.mw, op=op, success=success)
+            query_op.failure(on_failure)
+            query_op.with_progress(label).run_in_background()
+
+        def read_index(_):
+            deck_json = self.read_deck(self.get_deck_path(directory_path))
+            return None if import_cancelled() else deck_json
+
+        def build_deck(deck_json):
+            # The import dialog only needs the index, the notes are read once the import is confirmed
+            self.read_note_shards(directory_path, deck_json)
+            if import_cancelled():
+                return None
+            return deck_initializer.from_json(deck_json)
+
+        def import_media(_):
+            return self.import_media(directory_path)
+
+        def on_index_read(deck_json):
+            if deck_json is None:
+                finish(False)
+                return
+            import_config = self.read_import_config(directory_path, deck_json)
+            if import_config is None:
+                finish(False)
+                return
+
+            def on_deck_built(deck):
+                if deck is None:
+                    finish(False)
+                    return
+                if aqt.mw:
+                    aqt.mw.create_backup_now()
+                saved = []
+
+                def on_notes_done():
+                    if not saved:
+                        finish(False)
+                    elif import_config.use_media:
+                        run_in_background(import_media, lambda _: finish(True), "Importing media...")
+                    else:
+                        finish(True)
+
+                deck.save_to_collection(self.collection, import_config=import_config,
+                                        on_done=on_notes_done, on_saved=lambda: saved.append(True))
+
+            run_in_background(lambda _: build_deck(deck_json), on_deck_built, "Reading notes...")
+
+        run_in_background(read_index, on_index_read, "Reading deck...")
+
+    def import_media(self, directory_path) -> Optional[IngestResult]:
+        """
+        Copy the export's media into the collection in parallel, skipping files that are already
+        there with the same content, and add only the copied files to the media database.
+        """
         media_directory = directory_path.joinpath(MEDIA_SUBDIRECTORY_NAME)
-        if media_directory.exists():
-            unicode_media_directory = str(media_directory)
-            src_files = os.listdir(unicode_media_directory)
-            for filename in src_files:
-                full_filename = os.path.join(unicode_media_directory, filename)
-                if os.path.isfile(full_filename):
-                    shutil.copy(full_filename, self.collection.media.dir())
-        else:
+        if not media_directory.exists():
             print("Warning: no media directory exists.")
+            return None
+
+        unicode_media_directory = str(media_directory)
+        collection_media_directory = self.collection.media.dir()
+        result = ingest(collect_files(unicode_media_directory, recursive=False), collection_media_directory,
+                        copier=MediaCopier.for_folders(unicode_media_directory, collection_media_directory),
+                        progress=main_window_progress("Importing media: {processed} of {total} files"))
+        for file_name, error in result.failed.items():
+            print("Failed to copy a file {}. Full error: {}".format(file_name, error))
+        register_media_files(self.collection, result.copied)
+        return result
 
     def get_deck_path(self, directory_path):
         """
@@ -78,6 +146,43 @@ class AnkiJsonImporter:
         with file_path.open(encoding='utf8') as deck_file:
             return json.load(deck_file)
 
+    @staticmethod
+    def read_note_shards(directory_path, deck_json):
+        """
+        Put the notes of a sharded export (see AnkiJsonExporter._write_shards) back into its index,
+        reading the shards concurrently. Decks of single file exports are left as they are.
+        The import needs every note at once anyway, so memory peaks as for a single file export:
+        each shard's notes go into their deck as soon as they are read, and at most
+        SHARD_READ_WORKERS shard files are held as raw text at the same time.
+        """
+        sharded_decks = []
+
+        def collect(deck):
+            if "notes_file" in deck:
+                sharded_decks.append(deck)
+            for child in deck.get("children", []):
+                collect(child)
+
+        collect(deck_json)
+        if not sharded_decks:
+            return deck_json
+
+        def read_shard(deck):
+            shard_path = directory_path.joinpath(deck["notes_file"])
+            if not shard_path.exists():
+                raise ValueError("There is no {} file inside of the selected directory".format(shard_path))
+            with shard_path.open(encoding='utf8') as shard_file:
+                return json.load(shard_file)
+
+        with ThreadPoolExecutor(max_workers=SHARD_READ_WORKERS) as executor:
+            futures = {executor.submit(read_shard, deck): deck for deck in sharded_decks}
+            for future in as_completed(futures):
+                deck = futures[future]
+                deck["notes"] = future.result()
+                del deck["notes_file"]
+                deck.pop("note_count", None)
+        return deck_json
+
     @staticmethod
     def read_import_config(directory_path, deck_json):
         file_path = directory_path.joinpath(IMPORT_CONFIG_NAME)
@@ -96,14 +201,11 @@ class AnkiJsonImporter:
 
     @staticmethod
     def import_deck_from_path(collection, directory_path):
-        importer = AnkiJsonImporter(collection)
-        try:
-            if importer.load_deck(directory_path):
+        def on_done(imported):
+            if imported:
                 aqt.utils.showInfo("Import of {} deck was successful".format(directory_path.name))
-        except ValueError as error:
-            aqt.utils.showWarning("Error: {}. While trying to import deck from directory {}".format(
-                error.args[0], directory_path))
-            raise
+
+        AnkiJsonImporter(collection).load_deck(directory_path, on_done)
 
     @staticmethod
     def import_deck(collection, directory_provider: Callable[[str], Optional[str]]):
@@ -20,6 +20,8 @@ class ConfigEntry:
 @dataclass
 class PersonalFieldsHolder:
     personal_fields: defaultdict = field(init=False, default_factory=lambda: defaultdict(list))
+    # (model name, id, mod) -> indexes of the personal fields
+    _personal_field_indexes: dict = field(init=False, default_factory=dict, repr=False, compare=False)
 
     def is_personal_field(self, model_name, field_name):
         if model_name in self.personal_fields:
@@ -27,8 +29,19 @@ class PersonalFieldsHolder:
                 return True
         return False
 
+    def personal_field_indexes(self, model_dict):
+        """Indexes of the personal fields of a note type, computed once per note type version."""
+        key = (model_dict['name'], model_dict.get('id'), model_dict.get('mod'))
+        indexes = self._personal_field_indexes.get(key)
+        if indexes is None:
+            personal_fields = set(self.personal_fields.get(model_dict['name'], ()))
+            indexes = tuple(num for num, fld in enumerate(model_dict['flds']) if fld['name'] in personal_fields)
+            self._personal_field_indexes[key] = indexes
+        return indexes
+
     def add_field(self, model_name, field_name):
         self.personal_fields[model_name].append(field_name)
+        self._personal_field_indexes.clear()
 
 
 @dataclass
@@ -136,7 +149,9 @@ class ImportDialog(QDialog):
                 text = f"{text}: {'{:,}'.format(count)}"
             checkbox.setText(text)
 
-        set_checked_and_text(self.form.cb_notes, "Notes", len(self.deck_json['notes']))
+        # The index of a sharded export only has the note count, the notes are read after the dialog
+        note_count = len(self.deck_json['notes']) if 'notes' in self.deck_json else self.deck_json.get('note_count')
+        set_checked_and_text(self.form.cb_notes, "Notes", note_count)
         set_checked_and_text(self.form.cb_media, "Media Files", len(self.deck_json['media_files']))
 
         # TODO: Deck Parts to Use, check which are actually in the deck_json
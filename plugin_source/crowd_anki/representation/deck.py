@@ -5,12 +5,14 @@ from .deck_config import DeckConfig
 from .json_serializable import JsonSerializableAnkiDict
 from .note_model import NoteModel
 from ..anki.adapters.file_provider import FileProvider
+from ..anki.overrides.change_model_dialog import ChangeModelDialog
 from ..importer.import_dialog import ImportConfig
 from ..utils import utils
 from ..utils.constants import UUID_FIELD_NAME
 from ..utils.uuid import UuidFetcher
 from ..utils.notifier import AnkiModalNotifier
 from ...thread import run_function_in_thread
+from ... import profiling
 
 import os
 import aqt
@@ -22,6 +24,10 @@ from aqt.utils import showInfo
 from aqt import mw
 
 DeckMetadata = namedtuple("DeckMetadata", ["deck_configs", "models"])
+ModelTransition = namedtuple("ModelTransition", ["old_model_id", "note_ids"])
+
+# SQLite limits the number of bound parameters per query
+TRANSITION_SCAN_CHUNK_SIZE = 500
 
 class Deck(JsonSerializableAnkiDict):
     DECK_NAME_DELIMITER = "::"
@@ -73,6 +79,11 @@ class Deck(JsonSerializableAnkiDict):
 
         return result
 
+    def get_all_notes(self):
+        yield from self.notes
+        for child in self.children:
+            yield from child.get_all_notes()
+
     def get_note_count(self):
         return len(self.notes) + sum(child.get_note_count() for child in self.children)
 
@@ -143,25 +154,137 @@ class Deck(JsonSerializableAnkiDict):
 
         self.metadata = DeckMetadata(new_deck_configs, new_models)
         
-    def on_success(self, count: int) -> None:
+    def on_success(self, count: int, on_done=None) -> None:
         mw.progress.finish()
         if aqt.utils.askUser(f"{count} Notes got updated.\n\nDo you want to clear unused tags and empty cards from your collection?"):
             clear_unused_tags(parent=mw).run_in_background()
             show_empty_cards(mw)
         mw.reset()
+        if on_done:
+            on_done()
         
-    def save_to_collection(self, collection, import_config: ImportConfig):
-        self.save_metadata(collection)
+    def save_to_collection(self, collection, import_config: ImportConfig, on_done=None, on_saved=None,
+                           after_save=None):
+        """
+        Save metadata now and the notes in the background. Note model changes of existing notes are
+        found first, so their mappings can be asked for on the main thread before the notes are written.
+        `on_done` is called on the main thread once the import is over, `on_saved` before it only if it succeeded.
+        `after_save` is called in the background once the notes are written, before the import is over.
+        """
+        with profiling.span("metadata save", len(self.metadata.models)):
+            self.save_metadata(collection)
+
+        def find_model_transitions(collection):
+            with profiling.span("model transitions") as record:
+                transitions = self.find_model_transitions(collection)
+                record["count"] = sum(len(transition.note_ids) for transition in transitions.values())
+            return transitions
+
+        def save_notes(collection, transitions, model_map_cache):
+            with profiling.span("model changes", len(transitions)):
+                self.apply_model_changes(collection, transitions, model_map_cache)
+            with profiling.span("note writes") as record:
+                record["count"] = self.save_decks_and_notes(collection=collection,
+                                                            parent_name="",
+                                                            model_map_cache=model_map_cache,
+                                                            import_config=import_config)
+            if after_save:
+                after_save()
+            return record["count"]
+
+        def on_failure(error):
+            aqt.utils.show_exception(parent=mw, exception=error)
+            if on_done:
+                on_done()
+
+        def on_notes_saved(count):
+            if on_saved:
+                on_saved()
+            self.on_success(count, on_done)
+
+        def on_transitions_found(transitions):
+            model_map_cache = self.ask_for_model_maps(collection, transitions)
+            op = QueryOp(
+                parent=mw,
+                op=lambda collection: save_notes(collection, transitions, model_map_cache),
+                success=on_notes_saved,
+            )
+            op.failure(on_failure)
+            op.with_progress("Synchronizing...").run_in_background()
+
         op = QueryOp(
             parent=mw,
-            op=lambda collection=collection, parent_name="", model_map_cache=defaultdict(dict), import_config=import_config: self.save_decks_and_notes(collection=collection,
-                                  parent_name=parent_name,
-                                  model_map_cache=model_map_cache,
-                                  import_config=import_config
-                                  ),
-            success=self.on_success,
+            op=find_model_transitions,
+            success=on_transitions_found,
         )
-        op.with_progress("Synchronizing...").run_in_background()
+        op.failure(on_failure)
+        op.with_progress("Checking note types...").run_in_background()
+
+    def find_model_transitions(self, collection):
+        """
+        Existing notes that get a different note model with this import, as
+        (old model uuid, new model uuid) -> ModelTransition. Reads the notes table in bulk.
+        """
+        new_model_uuids = {note.get_uuid(): note.note_model_uuid for note in self.get_all_notes()}
+        model_uuids = {}
+        transitions = {}
+
+        guids = list(new_model_uuids)
+        for start in range(0, len(guids), TRANSITION_SCAN_CHUNK_SIZE):
+            chunk = guids[start:start + TRANSITION_SCAN_CHUNK_SIZE]
+            rows = collection.db.all(
+                f"select guid, id, mid from notes where guid in ({','.join('?' * len(chunk))})", *chunk)
+            for guid, note_id, model_id in rows:
+                if model_id not in model_uuids:
+                    model = collection.models.get(model_id)
+                    model_uuids[model_id] = model.get(UUID_FIELD_NAME) if model else None
+                key = (model_uuids[model_id], new_model_uuids[guid])
+                if key[0] == key[1]:
+                    continue
+                transitions.setdefault(key, ModelTransition(model_id, [])).note_ids.append(note_id)
+        return transitions
+
+    @staticmethod
+    def apply_model_changes(collection, transitions, model_map_cache):
+        """Change the note model of all notes of each transition at once, instead of note by note while saving them."""
+        uuid_fetcher = UuidFetcher(collection)
+        for (old_model_uuid, new_model_uuid), transition in transitions.items():
+            mapping = model_map_cache[old_model_uuid].get(new_model_uuid)
+            old_model = collection.models.get(transition.old_model_id)
+            new_model = uuid_fetcher.get_model(new_model_uuid)
+            if not mapping or old_model is None or new_model is None:
+                continue
+            collection.models.change(old_model,
+                                     transition.note_ids,
+                                     new_model,
+                                     mapping.field_map,
+                                     mapping.template_map)
+
+    @staticmethod
+    def ask_for_model_maps(collection, transitions):
+        """
+        Get the field and template mapping of every model change, asking only if the schemas
+        differ. Must run on the main thread.
+        """
+        model_map_cache = defaultdict(dict)
+        uuid_fetcher = UuidFetcher(collection)
+        for (old_model_uuid, new_model_uuid), transition in transitions.items():
+            old_model = collection.models.get(transition.old_model_id)
+            new_model = uuid_fetcher.get_model(new_model_uuid)
+            if old_model is None or new_model is None:
+                continue
+
+            mapping = NoteModel.identity_model_map(old_model, new_model)
+            if mapping:
+                model_map_cache[old_model_uuid][new_model_uuid] = mapping
+                continue
+
+            NoteModel(new_model).make_current(collection)
+            dialog = ChangeModelDialog(collection, transition.note_ids, old_model, parent=mw, apply_change=False)
+            dialog.exec()
+            model_map_cache[old_model_uuid][new_model_uuid] = \
+                NoteModel.ModelMap(dialog.get_field_map(), dialog.get_template_map())
+        return model_map_cache
 
     def save_metadata(self, collection):
         for config in self.metadata.deck_configs.values():
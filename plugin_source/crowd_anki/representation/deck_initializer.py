@@ -6,8 +6,21 @@ from ..anki.adapters.anki_deck import AnkiDeck
 from ..anki.adapters.note_model_file_provider import NoteModelFileProvider
 
 
-def from_collection(collection, name, deck_metadata=None, is_child=False, note_ids=None) -> Deck:
-    """load metadata, load notes, load children"""
+def get_deck_note_ids(collection, deck_id, modified_since=None):
+    """Ids of the notes with cards in the deck (not its children), optionally only those modified after `modified_since`"""
+    if modified_since is None:
+        return collection.decks.get_note_ids(deck_id, include_from_dynamic=True)
+
+    query = "select distinct cards.nid from cards join notes on notes.id = cards.nid " \
+            "where (cards.did = ? or cards.odid = ?) and notes.mod > ?"
+    return collection.db.list(query, deck_id, deck_id, int(modified_since))
+
+
+def from_collection(collection, name, deck_metadata=None, is_child=False, note_ids=None, modified_since=None) -> Deck:
+    """load metadata, load notes, load children
+
+    If `modified_since` is given, only notes with a later modification time are loaded.
+    """
     decks = collection.decks
     by_name = decks.by_name
     anki_dict = by_name(name)
@@ -23,10 +36,12 @@ def from_collection(collection, name, deck_metadata=None, is_child=False, note_i
 
     note_ids_to_load = note_ids # If we bulk suggest Notes, we know the nids beforehand
     
+    deck_note_ids = get_deck_note_ids(collection, deck.anki_dict["id"], modified_since)
     if note_ids_to_load is None: # If we don't know the nids, we have to load all notes
-        note_ids_to_load = collection.decks.get_note_ids(deck.anki_dict["id"], include_from_dynamic=True)
+        note_ids_to_load = deck_note_ids
     else: # If we know the nids, we have to filter out the ones that are not in the deck to prevent duplicates and wrong deck assignments
-        note_ids_to_load = [note_id for note_id in note_ids_to_load if note_id in collection.decks.get_note_ids(deck.anki_dict["id"], include_from_dynamic=True)]
+        deck_note_ids = set(deck_note_ids)
+        note_ids_to_load = [note_id for note_id in note_ids_to_load if note_id in deck_note_ids]
     
     # Finally load the notes
     if note_ids_to_load:
@@ -39,21 +54,21 @@ def from_collection(collection, name, deck_metadata=None, is_child=False, note_i
                        not in child_name[len(name) + len(Deck.DECK_NAME_DELIMITER):]]
 
     deck.children = seq(direct_children) \
-        .map(lambda child_name: from_collection(collection, child_name, deck.metadata, True, note_ids)) \
+        .map(lambda child_name: from_collection(collection, child_name, deck.metadata, True, note_ids, modified_since)) \
         .filter(lambda it: it is not None).order_by(lambda x: x.anki_dict["name"]).to_list()
 
     return deck
 
-def remove_unchanged_notes(deck, timestamp, timestamp2) -> None:
-    """Remove notes that have not been changed since the last sync"""
-    if deck is None:
+def remove_notes(deck, guids) -> None:
+    """Remove the notes with the given guids, e.g. because they are already up to date"""
+    if deck is None or not guids:
         return
-    
-    deck.notes = [note for note in deck.notes if note.anki_object.mod > timestamp or note.anki_object.mod > timestamp2]
-    
+
+    deck.notes = [note for note in deck.notes if note.get_uuid() not in guids]
+
     for child in deck.children:
-        remove_unchanged_notes(child, timestamp, timestamp2)
-    
+        remove_notes(child, guids)
+
 
 def from_json(json_dict, deck_metadata=None) -> Deck:
     """load metadata, load notes, load children"""
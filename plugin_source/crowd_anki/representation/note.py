@@ -4,12 +4,13 @@ import anki.utils
 from anki.notes import Note as AnkiNote
 from .json_serializable import JsonSerializableAnkiObject
 from .note_model import NoteModel
-from ..anki.overrides.change_model_dialog import ChangeModelDialog
 from ..importer.import_dialog import ImportConfig
 from ..config.config_settings import ConfigSettings
 from ..utils.constants import UUID_FIELD_NAME
 from ..utils.uuid import UuidFetcher
 
+OPTIONAL_TAG_PREFIX = 'AnkiCollab_Optional::'
+
 
 class Note(JsonSerializableAnkiObject):
     export_filter_set = JsonSerializableAnkiObject.export_filter_set | \
@@ -66,49 +67,28 @@ class Note(JsonSerializableAnkiObject):
 
     def handle_model_update(self, collection, model_map_cache):
         """
-        Update note's cards if note's model has changed
+        Update note's cards if note's model has changed.
+        Runs in the background, so the mappings are asked for up front (see Deck.ask_for_model_maps).
         """
-        old_model_uuid = self.note_type().get(UUID_FIELD_NAME)
+        old_model = self.note_type()
+        old_model_uuid = old_model.get(UUID_FIELD_NAME)
         if self.note_model_uuid == old_model_uuid:
             return
 
 
         uuid_fetcher = UuidFetcher(collection)
-        new_model = NoteModel.from_json(uuid_fetcher.get_model(self.note_model_uuid))
-        # todo if models semantically identical - create map without calling dialog
-        # old_model = NoteModel.from_json(uuid_fetcher.get_model(old_model_uuid))
-        # if NoteModel.check_semantically_identical(new_model, old_model):
-        #     # models are semantically identical, so create a mapping without calling dialog
-        #     field_map = {}
-        #     template_map = {}
-        #     for i, field in enumerate(new_model.anki_dict['flds']):
-        #         field_map[i] = i
-        #     for i, template in enumerate(new_model.anki_dict['tmpls']):
-        #         template_map[i] = i
-        #     model_map_cache[old_model_uuid][self.note_model_uuid] = NoteModel.ModelMap(field_map, template_map)
-        #     return
-
-        # # models are not semantically identical, so call dialog to create mapping
+        new_model = uuid_fetcher.get_model(self.note_model_uuid)
         mapping = model_map_cache[old_model_uuid].get(self.note_model_uuid)
-        if mapping:
-            collection.models.change(self.note_type(),
-                                     [self.anki_object.id],
-                                     new_model.anki_dict,
-                                     mapping.field_map,
-                                     mapping.template_map)
-        else:
-            new_model.make_current(collection)
-            # todo signals instead of direct dialog creation?
-            # Jan: This will cause issues on Mac (not in main thread because the parent is different)
-            dialog = ChangeModelDialog(collection, [self.anki_object.id], self.note_type())
-
-            # def on_accepted():
-            model_map_cache[old_model_uuid][self.note_model_uuid] = \
-                NoteModel.ModelMap(dialog.get_field_map(), dialog.get_template_map())
+        if not mapping:
+            # Missed by the pre-scan. Dialogs can't be shown from here, so keep fields and templates in place
+            mapping = NoteModel.default_model_map(old_model, new_model)
+            model_map_cache[old_model_uuid][self.note_model_uuid] = mapping
 
-            # dialog.accepted.connect(on_accepted)
-            # dialog.exec_()
-            # todo process cancel
+        collection.models.change(old_model,
+                                 [self.anki_object.id],
+                                 new_model,
+                                 mapping.field_map,
+                                 mapping.template_map)
 
         # To get an updated note to work with
         self.anki_object = uuid_fetcher.get_note(self.get_uuid())
@@ -141,19 +121,21 @@ class Note(JsonSerializableAnkiObject):
 
     def handle_import_config_changes(self, import_config, note_model):
         # Personal Fields
-        for num in range(len(self.anki_object_dict["fields"])):
-            if import_config.is_personal_field(note_model.anki_dict['name'], note_model.anki_dict['flds'][num]['name']):
-                self.anki_object_dict["fields"][num] = self.anki_object.fields[num]
+        fields = self.anki_object_dict["fields"]
+        for num in import_config.personal_field_indexes(note_model.anki_dict):
+            if num < len(fields):
+                fields[num] = self.anki_object.fields[num]
 
         # Tag Cards on Import
         self.anki_object_dict["tags"] += import_config.add_tag_to_cards
         
         # Remove unused optional tags
-        if import_config.has_optional_tags:
-            for tag in self.anki_object_dict["tags"]:
-                if tag.startswith('AnkiCollab_Optional::'):
-                    if tag.split('::')[1] not in import_config.optional_tags:
-                        self.anki_object_dict["tags"].remove(tag)
+        if getattr(import_config, "has_optional_tags", False):
+            selected_tags = import_config.selected_optional_tags()
+            self.anki_object_dict["tags"] = [
+                tag for tag in self.anki_object_dict["tags"]
+                if not tag.startswith(OPTIONAL_TAG_PREFIX) or tag.split('::')[1] in selected_tags
+            ]
                     
 
         
@@ -6,6 +6,15 @@ from ..anki.overrides.change_model_dialog import ChangeModelDialog
 from ..utils import utils
 from ..utils.uuid import UuidFetcher
 
+ModelSchema = namedtuple("ModelSchema", ["fields", "templates"])
+
+
+def model_schema(model_dict):
+    """Field and template names in ord order."""
+    fields = tuple(field['name'] for field in sorted(model_dict["flds"], key=lambda field: field['ord']))
+    templates = tuple(template['name'] for template in sorted(model_dict["tmpls"], key=lambda template: template['ord']))
+    return ModelSchema(fields, templates)
+
 
 class NoteModel(JsonSerializableAnkiDict):
     ModelMap = namedtuple("ModelMap", ["field_map", "template_map"])
@@ -33,6 +42,29 @@ class NoteModel(JsonSerializableAnkiDict):
 
         return True
 
+    @staticmethod
+    def identity_model_map(old_model, new_model):
+        """
+        Map every field and template to the one at the same position if the new model has the same
+        names there (it may add more at the end), so no one needs to be asked. None otherwise.
+        """
+        old_schema = model_schema(old_model)
+        new_schema = model_schema(new_model)
+        if (new_schema.fields[:len(old_schema.fields)] != old_schema.fields or
+                new_schema.templates[:len(old_schema.templates)] != old_schema.templates):
+            return None
+        return NoteModel.default_model_map(old_model, new_model)
+
+    @staticmethod
+    def default_model_map(old_model, new_model):
+        """Map fields and templates by position, like ChangeModelDialog does before the user changes anything."""
+        def by_position(attr):
+            new_entities = new_model[attr]
+            return {entity['ord']: new_entities[i]['ord'] if i < len(new_entities) else None
+                    for i, entity in enumerate(old_model[attr])}
+
+        return NoteModel.ModelMap(by_position('flds'), by_position('tmpls'))
+
     def save_to_collection(self, collection: Collection):
         # Todo regenerate cards on update
         # look into template manipulation in "models"
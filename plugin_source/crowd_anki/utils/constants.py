@@ -4,8 +4,12 @@ UUID_FIELD_NAME = 'crowdanki_uuid'
 DECK_FILE_NAME = "deck"
 DECK_FILE_EXTENSION = ".json"
 MEDIA_SUBDIRECTORY_NAME = "media"
+# Sharded exports keep the notes of every deck in [folder]/decks/[deck uuid].json
+DECK_SHARDS_SUBDIRECTORY_NAME = "decks"
 IMPORT_CONFIG_NAME = "import_config.yaml"
 
 ANKI_EXPORT_EXTENSION = "directory"
 
 USER_FILES_PATH = Path(__file__).parent.parent.joinpath('user_files')
+# user_files folder of the AnkiCollab add-on itself, which Anki keeps on add-on updates
+ADDON_USER_FILES_PATH = Path(__file__).parent.parent.parent.joinpath('user_files')
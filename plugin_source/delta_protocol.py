@@ -0,0 +1,122 @@
+"""
+Client side of the delta pull format.
+
+A pull request may ask for a delta by adding to the subscription details:
+
+    "delta": {
+        "version": 1,
+        "since": <unix time the cached payload was fetched at>,
+        "note_models": {<crowdanki_uuid>: <fingerprint>, ...},
+        "deck_configurations": {<crowdanki_uuid>: <fingerprint>, ...}
+    }
+
+where a fingerprint is the sha1 of the canonical JSON (sorted keys, no whitespace) of the entity.
+A server that supports it may then answer a subscription with a "delta" instead of a "deck":
+
+    "delta": {
+        "version": 1,
+        "deck": <optional deck tree without notes, if any deck changed>,
+        "added": [{"deck_uuid": ..., "note": {...}}, ...],
+        "modified": [{"deck_uuid": ..., "note": {...}}, ...],
+        "removed": [<guid>, ...],
+        "note_models": [<changed or new models>],
+        "deck_configurations": [<changed or new deck configurations>]
+    }
+
+Servers that don't know the format ignore the request and send the full "deck", which is used as before.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+DELTA_VERSION = 1
+# The server clock may be behind ours. Notes that are sent again although unchanged cost little.
+CLOCK_MARGIN = 60 * 60
+
+
+class DeltaError(Exception):
+    """The delta can't be applied to the cached payload, a full payload is needed."""
+
+
+def fingerprint(entity) -> str:
+    return hashlib.sha1(
+        json.dumps(entity, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf8")
+    ).hexdigest()
+
+
+def _collect(deck, key, collected):
+    for entity in deck.get(key, []):
+        collected[entity["crowdanki_uuid"]] = entity
+    for child in deck.get("children", []):
+        _collect(child, key, collected)
+    return collected
+
+
+def request_details(details: dict, skeleton: Optional[dict], fetched_at: Optional[float]) -> dict:
+    """The subscription details to send, asking for a delta if there is a cached payload to apply it to."""
+    if skeleton is None or not fetched_at:
+        return details
+    return {
+        **details,
+        "delta": {
+            "version": DELTA_VERSION,
+            "since": int(fetched_at - CLOCK_MARGIN),
+            "note_models": {uuid: fingerprint(model) for uuid, model in _collect(skeleton, "note_models", {}).items()},
+            "deck_configurations": {
+                uuid: fingerprint(config) for uuid, config in _collect(skeleton, "deck_configurations", {}).items()
+            },
+        },
+    }
+
+
+def is_delta(subscription: dict) -> bool:
+    return "delta" in subscription and "deck" not in subscription
+
+
+def apply_delta(base_payload: dict, delta: dict) -> dict:
+    """The full deck payload: the cached base payload with the delta applied."""
+    if delta.get("version") != DELTA_VERSION:
+        raise DeltaError(f"unsupported delta version {delta.get('version')}")
+
+    # guid -> (deck uuid, note), in payload order
+    notes = {}
+
+    def take_notes(deck):
+        for note in deck.get("notes", []):
+            notes[note["guid"]] = (deck.get("crowdanki_uuid", ""), note)
+        for child in deck.get("children", []):
+            take_notes(child)
+
+    take_notes(base_payload)
+    for guid in delta.get("removed", []):
+        notes.pop(guid, None)
+    for entry in delta.get("added", []) + delta.get("modified", []):
+        notes[entry["note"]["guid"]] = (entry["deck_uuid"], entry["note"])
+
+    note_models = _collect(base_payload, "note_models", {})
+    note_models.update((model["crowdanki_uuid"], model) for model in delta.get("note_models", []))
+    deck_configs = _collect(base_payload, "deck_configurations", {})
+    deck_configs.update((config["crowdanki_uuid"], config) for config in delta.get("deck_configurations", []))
+
+    skeleton = delta.get("deck") or base_payload
+    decks = {}
+
+    def rebuild(deck, is_root):
+        rebuilt = {key: value for key, value in deck.items()
+                   if key not in ("notes", "children", "note_models", "deck_configurations")}
+        rebuilt["notes"] = []
+        decks[rebuilt.get("crowdanki_uuid", "")] = rebuilt
+        if is_root:
+            # The importer collects the note models of every deck, and the deck configurations of the root
+            rebuilt["note_models"] = list(note_models.values())
+            rebuilt["deck_configurations"] = list(deck_configs.values())
+        rebuilt["children"] = [rebuild(child, False) for child in deck.get("children", [])]
+        return rebuilt
+
+    result = rebuild(skeleton, True)
+    for deck_uuid, note in notes.values():
+        if deck_uuid not in decks:
+            raise DeltaError(f"note {note.get('guid')} belongs to unknown deck {deck_uuid}")
+        decks[deck_uuid]["notes"].append(note)
+    return result
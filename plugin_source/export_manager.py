@@ -1,5 +1,6 @@
 import json
 import os
+import time
 import requests
 
 
@@ -17,8 +18,10 @@ from datetime import datetime, timedelta
 import base64
 import gzip
 
-from .google_drive_api import GoogleDriveAPI
+from .google_drive_api import get_drive_api
+from .media_manifest import get_media_manifest
 from .thread import run_function_in_thread
+from . import profiling
 
 
 from .crowd_anki.anki.adapters.note_model_file_provider import NoteModelFileProvider
@@ -43,6 +46,24 @@ def get_timestamp(deck_hash):
                 return unix_timestamp
     return None
 
+def get_submit_watermark(deck_hash, did):
+    """Time of the last successful full suggestion of this deck or one of its parents, or None"""
+    strings_data = mw.addonManager.getConfig(__name__)
+    if strings_data and deck_hash in strings_data:
+        watermarks = strings_data[deck_hash].get("last_submitted", {})
+        deck_ids = [did] + [parent["id"] for parent in mw.col.decks.parents(did)]
+        submitted = [watermarks[str(deck_id)] for deck_id in deck_ids if str(deck_id) in watermarks]
+        if submitted:
+            return max(submitted)
+    return None
+
+def update_submit_watermark(deck_hash, did, timestamp):
+    strings_data = mw.addonManager.getConfig(__name__)
+    if strings_data and deck_hash in strings_data:
+        watermarks = strings_data[deck_hash].setdefault("last_submitted", {})
+        watermarks[str(did)] = max(timestamp, watermarks.get(str(did), 0))
+        mw.addonManager.writeConfig(__name__, strings_data)
+
 def get_gdrive_data(deck_hash):
     strings_data = mw.addonManager.getConfig(__name__)
     if strings_data:        
@@ -112,17 +133,23 @@ def on_media_upload_done(count: int) -> None:
     else:
         aqt.utils.showInfo("Upload done!")
 
+def local_media_files(deck_hash, dir_path, media_files):
+    manifest = get_media_manifest(deck_hash, dir_path)
+    present = sorted(manifest.present(media_files))
+    manifest.save()
+    return present
+
 def upload_media_with_progress(deck_hash, media_files):
     gdrive_data = get_gdrive_data(deck_hash)
     if gdrive_data is not None:
-        api = GoogleDriveAPI(
+        api = get_drive_api(
             service_account=gdrive_data['service_account'],
             folder_id=gdrive_data['folder_id'],
         )
         dir_path = aqt.mw.col.media.dir()
         op = QueryOp(
             parent=mw,
-            op=lambda _: api.upload_files_to_folder(dir_path, media_files, media_upload_progress_cb),
+            op=lambda _: api.upload_files_to_folder(dir_path, local_media_files(deck_hash, dir_path, media_files), media_upload_progress_cb),
             success=on_media_upload_done
         )
         if point_version() >= 231000:
@@ -131,12 +158,12 @@ def upload_media_with_progress(deck_hash, media_files):
     else:
         aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("No Google Drive folder set for this deck. Please set one in the AnkiCollab settings.", parent=QApplication.focusWidget()))
 
-def submit_with_progress(deck, did, rationale):
+def submit_with_progress(deck, did, rationale, watermark=None):
     upload_media = aqt.utils.askUser("Do you want to upload the media to Google Drive?")
     
     op = QueryOp(
         parent=mw,
-        op=lambda _: submit_deck(deck, did, rationale, False, upload_media),
+        op=lambda _: submit_deck(deck, did, rationale, False, upload_media, watermark),
         success=do_nothing
     )
     if point_version() >= 231000:
@@ -146,12 +173,13 @@ def submit_with_progress(deck, did, rationale):
 def upload_media_to_gdrive(deck_hash, media_files):
     gdrive_data = get_gdrive_data(deck_hash)
     if gdrive_data is not None:                
-        api = GoogleDriveAPI(
+        api = get_drive_api(
             service_account=gdrive_data['service_account'],
             folder_id=gdrive_data['folder_id'],
         )
         dir_path = aqt.mw.col.media.dir()
-        api.upload_files_to_folder(dir_path, media_files)
+        with profiling.span("upload", len(media_files)):
+            api.upload_files_to_folder(dir_path, local_media_files(deck_hash, dir_path, media_files))
     else:
         if len(media_files) > 0:
             aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("No Google Drive folder set for this deck.", parent=QApplication.focusWidget()))
@@ -163,65 +191,90 @@ def get_maintainer_data():
             return strings_data["settings"]["token"], strings_data["settings"]["auto_approve"]
     return "", False
             
-def submit_deck(deck, did, rationale, media_async, upload_media):    
-    deck_res = json.dumps(deck, default=Deck.default_json, sort_keys=True, indent=4, ensure_ascii=False)
-    deckHash = get_deck_hash_from_did(did)#
-    newName = get_local_deck_from_hash(deckHash)
-    deckPath =  mw.col.decks.name(did)
+def submit_deck(deck, did, rationale, media_async, upload_media, watermark=None):
+    # watermark: start time of a full deck suggestion. Stored on success so the next one only sends newer notes
+    try:
+        with profiling.span("serialize") as record:
+            deck_res = json.dumps(deck, default=Deck.default_json, sort_keys=True, indent=4, ensure_ascii=False)
+            record["count"] = len(deck_res)
+        deckHash = get_deck_hash_from_did(did)#
+        newName = get_local_deck_from_hash(deckHash)
+        deckPath =  mw.col.decks.name(did)
     
-    if deckHash is None:
-        aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("Config Error: Please update the Local Deck in the Subscriptions window", parent=QApplication.focusWidget()))
-    else:
-        token, auto_approve = get_maintainer_data()
-        data = {
-            "remote_deck": deckHash, 
-            "deck_path": deckPath, 
-            "new_name": newName, 
-            "deck": deck_res, 
-            "rationale": rationale,
-            "token": token,
-            "force_overwrite": auto_approve,
-            }
-        compressed_data = gzip.compress(json.dumps(data).encode('utf-8'))
-        based_data = base64.b64encode(compressed_data)
-        headers = {"Content-Type": "application/json"}
-        response = requests.post("https://plugin.ankicollab.com/submitCard", data=based_data, headers=headers)
+        if deckHash is None:
+            aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("Config Error: Please update the Local Deck in the Subscriptions window", parent=QApplication.focusWidget()))
+        else:
+            token, auto_approve = get_maintainer_data()
+            data = {
+                "remote_deck": deckHash, 
+                "deck_path": deckPath, 
+                "new_name": newName, 
+                "deck": deck_res, 
+                "rationale": rationale,
+                "token": token,
+                "force_overwrite": auto_approve,
+                }
+            with profiling.span("compress"):
+                compressed_data = gzip.compress(json.dumps(data).encode('utf-8'))
+                based_data = base64.b64encode(compressed_data)
+            headers = {"Content-Type": "application/json"}
+            with profiling.span("network", len(based_data)):
+                response = requests.post("https://plugin.ankicollab.com/submitCard", data=based_data, headers=headers)
+        
+            if watermark is not None and response.status_code == 200:
+                aqt.mw.taskman.run_on_main(lambda: update_submit_watermark(deckHash, did, watermark))
         
-        # Hacky, but for bulk suggestions we want the progress bar to include media files, 
-        # but for single suggestions we can run it in the background to make it a smoother experience    
-        if upload_media:
-            if media_async: 
-                run_function_in_thread(upload_media_to_gdrive, deckHash, deck.get_media_file_list())
-            else:
-                upload_media_to_gdrive(deckHash, deck.get_media_file_list())
+            # Hacky, but for bulk suggestions we want the progress bar to include media files, 
+            # but for single suggestions we can run it in the background to make it a smoother experience    
+            if upload_media:
+                if media_async: 
+                    run_function_in_thread(upload_media_to_gdrive, deckHash, deck.get_media_file_list())
+                else:
+                    upload_media_to_gdrive(deckHash, deck.get_media_file_list())
             
-        if response:
-            aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip(f"AnkiCollab Upload:\n{response.text}\n", parent=QApplication.focusWidget()))
+            if response:
+                aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip(f"AnkiCollab Upload:\n{response.text}\n", parent=QApplication.focusWidget()))
+    finally:
+        # Also when the upload failed, so the timings of what did run are kept
+        profiling.flush("suggest")
 
 def suggest_subdeck(did):
     deck = AnkiDeck(aqt.mw.col.decks.get(did, default=False))
     if deck.is_dynamic:
         return
     
-    disambiguate_note_model_uuids(aqt.mw.col)
-    deck = deck_initializer.from_collection(aqt.mw.col, deck.name)
-    
     deckHash = get_deck_hash_from_did(did)
     if deckHash is None:
         aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("Config Error: Please update the Local Deck in the Subscriptions window", parent=QApplication.focusWidget()))
         return
-    response = requests.get("https://plugin.ankicollab.com/GetDeckTimestamp/" + deckHash)
     
-    if response and response.status_code == 200:
-        last_updated = float(response.text)
-        last_pulled = get_timestamp(deckHash)
-        if last_pulled is None:
-            last_pulled = 0.0
-        deck_initializer.remove_unchanged_notes(deck, last_updated, last_pulled)
+    # Taken before loading the notes, so edits made during the upload are sent next time
+    submit_started = int(time.time())
+    
+    # Only notes changed since the last update, pull or successful suggestion of this deck need to be sent
+    modified_since = get_submit_watermark(deckHash, did)
+    try:
+        with profiling.span("network"):
+            response = requests.get("https://plugin.ankicollab.com/GetDeckTimestamp/" + deckHash)
+        if response and response.status_code == 200:
+            last_updated = float(response.text)
+            last_pulled = get_timestamp(deckHash)
+            if last_pulled is None:
+                last_pulled = 0.0
+            modified_since = max(min(last_updated, last_pulled), modified_since or 0.0)
+    
+        disambiguate_note_model_uuids(aqt.mw.col)
+        with profiling.span("load notes") as record:
+            deck = deck_initializer.from_collection(aqt.mw.col, deck.name, modified_since=modified_since)
+            record["count"] = deck.get_note_count()
+    except BaseException:
+        # submit_deck writes the timings of a suggestion that gets that far
+        profiling.flush("suggest")
+        raise
     
     #spaghetti name fix
     deck.anki_dict["name"] = mw.col.decks.name(did).split("::")[-1]
-    submit_with_progress(deck, did, 9) # 9: Bulk Suggestion rationale
+    submit_with_progress(deck, did, 9, submit_started) # 9: Bulk Suggestion rationale
     
 def bulk_suggest_notes(nids):
     notes = [aqt.mw.col.get_note(nid) for nid in nids]
@@ -13,12 +13,12 @@ except ImportError:
 
 from aqt.qt import *
 
-from .media_export import DeckMediaExporter, NoteMediaExporter, get_configured_search_field, get_configured_exts, export_with_progress
+from .media_export import DeckMediaExporter, NoteMediaExporter, get_configured_search_field, get_configured_exts, get_configured_hardlinks, export_with_progress
 
 from .export_manager import get_deck_hash_from_did, get_gdrive_data, upload_media_with_progress
 from .import_manager import handle_media_import
 
-from .google_drive_api import GoogleDriveAPI
+from .google_drive_api import get_drive_api
 
 def on_deck_browser_will_show_options_menu(menu: QMenu, did: int) -> None:
     """Adds a menu item under the gears icon to export a deck's media files."""
@@ -36,7 +36,7 @@ def on_deck_browser_will_show_options_menu(menu: QMenu, did: int) -> None:
         exts = get_configured_exts(config)
         exporter = DeckMediaExporter(mw.col, DeckId(did), field, exts)
         note_count = mw.col.decks.card_count([DeckId(did)], include_subdecks=True)
-        export_with_progress(mw, exporter, note_count)
+        export_with_progress(mw, exporter, note_count, get_configured_hardlinks(config))
         
     def gdrive_upload_missing() -> None:
         gdrive_data = get_gdrive()
@@ -51,13 +51,14 @@ def on_deck_browser_will_show_options_menu(menu: QMenu, did: int) -> None:
     def gdrive_download_missing() -> None:
         gdrive_data = get_gdrive()
         if gdrive_data is not None:
+            deckHash = get_deck_hash_from_did(did)
             exporter = DeckMediaExporter(mw.col, DeckId(did))
-            api = GoogleDriveAPI(
+            api = get_drive_api(
                 service_account=gdrive_data['service_account'],
                 folder_id=gdrive_data['folder_id'],
             )
             all_media = exporter.get_list_of_media() # this is filtered in the handle_media function to only download missing media
-            handle_media_import(all_media, api)
+            handle_media_import(all_media, api, deckHash, verify=True)
         else:
             aqt.mw.taskman.run_on_main(lambda: aqt.utils.tooltip("No Google Drive folder set for this deck.", parent=QApplication.focusWidget()))
 
@@ -86,10 +87,10 @@ def add_browser_menu_item(browser: Browser) -> None:
         config = mw.addonManager.getConfig(__name__)
         field = get_configured_search_field(config)
         exts = get_configured_exts(config)
-        selected_notes = [mw.col.get_note(nid) for nid in browser.selected_notes()]
-        exporter = NoteMediaExporter(mw.col, selected_notes, field, exts)
-        note_count = len(selected_notes)
-        export_with_progress(browser, exporter, note_count)
+        selected_nids = list(browser.selected_notes())
+        exporter = NoteMediaExporter(mw.col, selected_nids, field, exts)
+        note_count = len(selected_nids)
+        export_with_progress(browser, exporter, note_count, get_configured_hardlinks(config))
 
     action = QAction("AnkiCollab: Export Media to Disk", browser)
     qconnect(action.triggered, export_selected)
@@ -1,46 +1,121 @@
 import os
 import io
+import hashlib
 import json
 import zipfile
 import sys
+import importlib.util
+import threading
+from types import SimpleNamespace
 
 import aqt
 from aqt import mw
 from aqt.qt import *
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "dist"))
+_google = None
+_google_lock = threading.Lock()
 
-from googleapiclient.http import MediaFileUpload
-from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
+
+def _load_google_client():
+    """Import the vendored Google client on first use. It takes a long time to load and only media actions need it."""
+    global _google
+    with _google_lock:
+        if _google is not None:
+            return _google
+
+        # Thanks to abdo for this fix
+        dist_path = os.path.join(os.path.dirname(__file__), "dist")
+        if dist_path not in sys.path:
+            sys.path.append(dist_path)
+        source = os.path.join(dist_path, "google", "__init__.py")
+        spec = importlib.util.spec_from_file_location(
+            "google", source, submodule_search_locations=[]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["google"] = module
+        spec.loader.exec_module(module)
+
+        from googleapiclient.http import MediaFileUpload
+        from googleapiclient.errors import HttpError
+        from googleapiclient.discovery import build
+        from google.oauth2 import service_account
+
+        _google = SimpleNamespace(
+            MediaFileUpload=MediaFileUpload,
+            HttpError=HttpError,
+            build=build,
+            service_account=service_account,
+        )
+    return _google
+
+
+# Shared between all GoogleDriveAPI instances. Credentials keep their OAuth token until it expires,
+# services are built once per thread because the underlying httplib2 connection is not thread-safe.
+_cache_lock = threading.Lock()
+_api_cache = {}
+_credentials_cache = {}
+_thread_services = threading.local()
+
+
+def _account_key(service_account):
+    return service_account.get("client_email"), service_account.get("private_key_id")
+
+
+def get_drive_api(service_account, folder_id):
+    """Return the process-wide GoogleDriveAPI for this service account and folder."""
+    key = _account_key(service_account) + (folder_id,)
+    with _cache_lock:
+        api = _api_cache.get(key)
+    if api is None:
+        api = GoogleDriveAPI(service_account=service_account, folder_id=folder_id)
+        with _cache_lock:
+            api = _api_cache.setdefault(key, api)
+    return api
 
 
 class GoogleDriveAPI:
     def __init__(self, service_account, folder_id):
+        self.google = _load_google_client()
         self.SCOPES = ['https://www.googleapis.com/auth/drive.file']
         self.SERVICE_ACCOUNT = service_account
         self.FOLDER_ID = folder_id
         self.creds = None
-        self.service = None
         self._set_up_credentials()
-        self._set_up_service()
     
     def _set_up_credentials(self):
-        self.creds = service_account.Credentials.from_service_account_info(
-            self.SERVICE_ACCOUNT,
-            scopes=self.SCOPES
-        )
+        key = _account_key(self.SERVICE_ACCOUNT)
+        with _cache_lock:
+            self.creds = _credentials_cache.get(key)
+            if self.creds is None:
+                self.creds = self.google.service_account.Credentials.from_service_account_info(
+                    self.SERVICE_ACCOUNT,
+                    scopes=self.SCOPES
+                )
+                _credentials_cache[key] = self.creds
         
     def _handle_http_error(self, error):
-        if isinstance(error, HttpError):
+        if isinstance(error, self.google.HttpError):
             error_message = error._get_reason()
         else:
             error_message = str(error)
         print(f"[GDrive] An error occurred: {error_message}")
 
-    def _set_up_service(self):
-        self.service = build('drive', 'v3', credentials=self.creds)
+    @property
+    def service(self):
+        services = getattr(_thread_services, "services", None)
+        if services is None:
+            services = _thread_services.services = {}
+        key = _account_key(self.SERVICE_ACCOUNT)
+        if key not in services:
+            services[key] = self._build_service()
+        return services[key]
+
+    def _build_service(self):
+        try:
+            # Use the discovery document bundled with the client instead of fetching it
+            return self.google.build('drive', 'v3', credentials=self.creds, static_discovery=True, cache_discovery=False)
+        except TypeError:  # googleapiclient < 2.0 has no static discovery
+            return self.google.build('drive', 'v3', credentials=self.creds, cache_discovery=False)
           
     def chunks(self, lst, chunk_size):
         """Yield successive chunk_size-sized chunks from lst."""
@@ -48,18 +123,24 @@ class GoogleDriveAPI:
             yield lst[i:i + chunk_size]
              
     def download_selected_files_as_zip(self, file_names, local_folder_path, download_progress_cb=None):
-        files = []
+        """Return the number of downloaded files, -1 if none of them are on the drive or -2 on an API error."""
         counter = 0
-        for chunk in self.chunks(file_names, 50):  # break up file_names into chunks of 100
+        found_any = False
+        for chunk in self.chunks(file_names, 50):  # break up file_names into chunks of 50
             if mw.progress.want_cancel():
                 break
             query = f"("
             query += " or ".join([f"name='{file_name}'" for file_name in chunk])
             query += ")"
-            files.extend(self.query_files(query))
-            counter += self._download_files(files, local_folder_path, len(file_names), counter, download_progress_cb)
+            files = self.query_files(query)
+            if not files:
+                continue
+            found_any = True
+            counter = self._download_files(files, local_folder_path, len(file_names), counter, download_progress_cb)
+            if counter < 0:
+                return counter
+        return counter if found_any else -1
 
-            
     def query_files(self, query):
         files = []
         try:            
@@ -69,14 +150,14 @@ class GoogleDriveAPI:
                                                 supportsAllDrives=True,
                                                 includeItemsFromAllDrives=True,
                                                 fields='nextPageToken, '
-                                                    'files(id, name)',
+                                                    'files(id, name, size, md5Checksum)',
                                                 pageToken=page_token).execute()
                 files.extend(response.get('files', []))
                 page_token = response.get('nextPageToken', None)
                 if page_token is None:
                     break
     
-        except HttpError as error:
+        except self.google.HttpError as error:
             self._handle_http_error(error)
         
         return files       
@@ -84,6 +165,10 @@ class GoogleDriveAPI:
     def list_media_files_in_folder(self):
         query = f"mimeType != 'application/vnd.google-apps.folder' and trashed=false"
         return self.query_files(query)
+
+    def list_media_manifest(self):
+        """name -> md5 of every file in the folder (None where Drive reports no checksum)."""
+        return {item['name']: item.get('md5Checksum') for item in self.list_media_files_in_folder()}
     
     def _download_files(self, items, local_folder_path, total_files, curr_amount, download_progress_cb) -> int:
         try:
@@ -101,6 +186,9 @@ class GoogleDriveAPI:
                         added_file_names.add(file_name)
                         request = self.service.files().get_media(fileId=item['id'])
                         file_bytes = io.BytesIO(request.execute())
+                        if not self._matches_listing(item, file_bytes.getvalue()):
+                            print(f"[GDrive] Skipping {file_name}: the download does not match its checksum")
+                            continue
                         zip_file.writestr(file_name, file_bytes.getvalue())
                         curr_amount += 1
 
@@ -118,14 +206,20 @@ class GoogleDriveAPI:
             
             return curr_amount
 
-        except HttpError as error:
+        except self.google.HttpError as error:
             self._handle_http_error(error)
             return -2
 
+    @staticmethod
+    def _matches_listing(item, data):
+        if 'size' in item and int(item['size']) != len(data):
+            return False
+        return 'md5Checksum' not in item or hashlib.md5(data).hexdigest() == item['md5Checksum']
+
     def upload_files_to_folder(self, base_path, file_names, upload_progress_cb=None):
         try:            
-            existing_media = self.list_media_files_in_folder()
-            missing_media = [media for media in file_names if not any(media_name['name'] == media for media_name in existing_media) and os.path.exists(os.path.join(base_path, media))]
+            existing_media = {item['name'] for item in self.list_media_files_in_folder()}
+            missing_media = [media for media in file_names if media not in existing_media and os.path.exists(os.path.join(base_path, media))]
                 
             file_ids = []
             total_files = len(missing_media)
@@ -136,7 +230,7 @@ class GoogleDriveAPI:
                     'name': file_name,
                     'parents': [self.FOLDER_ID],
                 }
-                media = MediaFileUpload(file_path, resumable=True)
+                media = self.google.MediaFileUpload(file_path, resumable=True)
                 file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
                 file_ids.append(file.get('id'))
             
@@ -148,5 +242,5 @@ class GoogleDriveAPI:
 
             return file_ids
 
-        except HttpError as error:
+        except self.google.HttpError as error:
             self._handle_http_error(error)
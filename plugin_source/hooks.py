@@ -13,6 +13,7 @@ from typing import Sequence
 from .export_manager import *
 from .import_manager import *
 from .thread import run_function_in_thread
+from .update_checker import update_checker
 
 from .gear_menu_setup import add_browser_menu_item, on_deck_browser_will_show_options_menu
 from .dialogs import AddChangelogDialog, get_login_token
@@ -126,9 +127,13 @@ def request_update():
     remove_nonexistent_decks()
     handle_pull(None)
             
-def onProfileLoaded():
+def on_check_for_new_content():
     aqt.utils.tooltip("Retrieving latest data from AnkiCollab...")
     run_function_in_thread(request_update)
+            
+def onProfileLoaded():
+    # Only decks whose remote timestamp changed are pulled, unchanged ones are checked less and less often
+    update_checker.start()
     
 # Broken. Threading issue? #TODO
 # def onDeleteNotes(col: Collection, ids: Sequence[anki.notes.NoteId]):
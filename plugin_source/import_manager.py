@@ -1,11 +1,13 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from enum import Enum
 import json
 import os
+import threading
+import time
 import requests
 from datetime import datetime, timedelta
-from concurrent.futures import Future
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 from pprint import pp
 from typing import List
@@ -30,12 +32,21 @@ from .crowd_anki.representation import deck_initializer
 from .crowd_anki.anki.adapters.anki_deck import AnkiDeck
 from .crowd_anki.representation.deck import Deck
 
-from .google_drive_api import GoogleDriveAPI
+from .google_drive_api import get_drive_api
+from .media_ingest import register_media_files, wants_full_media_check
+from .media_manifest import get_media_manifest
+from . import profiling
+from . import subscription_cache
+from . import delta_protocol
 
 
 import base64
 import gzip
 
+# Subscriptions are downloaded and decoded concurrently, but written to the collection one at a time
+PULL_WORKERS = 4
+PULL_URL = "https://plugin.ankicollab.com/pullChanges"
+
 
 @dataclass
 class ConfigEntry:
@@ -48,6 +59,10 @@ class PersonalFieldsHolder:
     personal_fields: defaultdict = field(
         init=False, default_factory=lambda: defaultdict(list)
     )
+    # (model name, id, mod) -> indexes of the personal fields
+    _personal_field_indexes: dict = field(
+        init=False, default_factory=dict, repr=False, compare=False
+    )
 
     def is_personal_field(self, model_name, field_name):
         if model_name in self.personal_fields:
@@ -55,8 +70,23 @@ class PersonalFieldsHolder:
                 return True
         return False
 
+    def personal_field_indexes(self, model_dict):
+        """Indexes of the personal fields of a note type, computed once per note type version."""
+        key = (model_dict["name"], model_dict.get("id"), model_dict.get("mod"))
+        indexes = self._personal_field_indexes.get(key)
+        if indexes is None:
+            personal_fields = set(self.personal_fields.get(model_dict["name"], ()))
+            indexes = tuple(
+                num
+                for num, fld in enumerate(model_dict["flds"])
+                if fld["name"] in personal_fields
+            )
+            self._personal_field_indexes[key] = indexes
+        return indexes
+
     def add_field(self, model_name, field_name):
         self.personal_fields[model_name].append(field_name)
+        self._personal_field_indexes.clear()
 
 
 @dataclass
@@ -71,6 +101,15 @@ class ImportConfig(PersonalFieldsHolder):
 
     ignore_deck_movement: bool
 
+    _selected_optional_tags: frozenset = field(
+        init=False, default=None, repr=False, compare=False
+    )
+
+    def selected_optional_tags(self):
+        if self._selected_optional_tags is None:
+            self._selected_optional_tags = frozenset(self.optional_tags)
+        return self._selected_optional_tags
+
 
 def media_download_progress_cb(curr: int, max_i: int):
     aqt.mw.taskman.run_on_main(
@@ -82,8 +121,24 @@ def media_download_progress_cb(curr: int, max_i: int):
     )
 
 
+def download_missing_media(api, missing_files, dir_path, manifest=None) -> int:
+    count = api.download_selected_files_as_zip(
+        missing_files, dir_path, media_download_progress_cb
+    ) if missing_files else 0
+    if count > 0:
+        # Only the files that were missing before can have been downloaded
+        downloaded = [file_name for file_name in missing_files if os.path.exists(os.path.join(dir_path, file_name))]
+        if manifest is not None:
+            manifest.record({file_name: None for file_name in downloaded})
+        register_media_files(mw.col, downloaded)
+    if manifest is not None:
+        manifest.save()
+    return count
+
+
 def on_media_download_done(count: int) -> None:
-    mw.col.media.check()
+    if wants_full_media_check():
+        mw.col.media.check()
     mw.progress.finish()
     if count == 0:
         aqt.utils.showWarning("No new media downloaded.")
@@ -93,21 +148,43 @@ def on_media_download_done(count: int) -> None:
         aqt.utils.showInfo("Google API Error.")
 
 
-def handle_media_import(media_files, api):
+def handle_media_import(media_files, api, deck_hash=None, verify=False):
+    """
+    Download the files in media_files that are missing locally. With a deck_hash, the
+    subscription's media manifest answers that instead of the disk. verify also re-checks
+    known files against the manifest and the Drive listing and downloads damaged ones again.
+    """
     if media_files is None:
         return
     dir_path = aqt.mw.col.media.dir()
-    missing_files = []
-    for file_name in media_files:
-        if not os.path.exists(os.path.join(dir_path, file_name)):
-            missing_files.append(file_name)
+    manifest = get_media_manifest(deck_hash, dir_path) if deck_hash is not None else None
+
+    def find_missing_files():
+        with profiling.span("media resolution", len(media_files)):
+            if manifest is None:
+                return [file_name for file_name in media_files if not os.path.exists(os.path.join(dir_path, file_name))]
+            missing = manifest.missing(media_files, verify)
+            if verify:
+                _, _, changed = manifest.diff_remote(api.list_media_manifest())
+                missing |= changed & set(media_files)
+            return sorted(missing)
+
+    if verify:
+        # Hashing changed files and listing the folder take a while
+        op = QueryOp(
+            parent=mw,
+            op=lambda _: download_missing_media(api, find_missing_files(), dir_path, manifest),
+            success=on_media_download_done
+        )
+        op.with_progress("Checking media files...").run_in_background()
+        return
+
+    missing_files = find_missing_files()
     # Download the missing files
     if len(missing_files) > 0:
         op = QueryOp(
             parent=mw,
-            op=lambda _: api.download_selected_files_as_zip(
-                missing_files, dir_path, media_download_progress_cb
-            ),
+            op=lambda _: download_missing_media(api, missing_files, dir_path, manifest),
             success=on_media_download_done
         )
         op.with_progress(
@@ -204,7 +281,7 @@ def delete_notes(nids):
     )
 
 
-def install_update(subscription):
+def install_update(subscription, on_done=None):
     if check_optional_tag_changes(
         subscription["deck_hash"], subscription["optional_tags"]
     ):
@@ -220,19 +297,49 @@ def install_update(subscription):
     service_account = subscription["gdrive"]["service_account"]
     gdrive_folder = subscription["gdrive"]["folder_id"]
 
-    deck = deck_initializer.from_json(subscription["deck"])
+    selected_tags = [tag for tag, value in subscribed_tags.items() if value]
+    has_optional_tags = True if subscription["optional_tags"] else False
+
+    # Importing changes the payload, so the snapshot of what is applied has to be taken before
+    snapshot = subscription.get("cache_snapshot") or subscription_cache.take_snapshot(
+        subscription["deck_hash"], subscription["deck"]
+    )
     config = prep_config(
         subscription["protected_fields"],
-        [tag for tag, value in subscribed_tags.items() if value],
-        True if subscription["optional_tags"] else False,
+        selected_tags,
+        has_optional_tags,
+    )
+    fingerprint = subscription_cache.config_fingerprint(
+        subscription["protected_fields"], selected_tags, has_optional_tags, config.ignore_deck_movement
     )
-    deck.save_to_collection(aqt.mw.col, import_config=config)
+    with profiling.span("deck initialization"):
+        deck = deck_initializer.from_json(subscription["deck"])
+    with profiling.span("cache diff") as record:
+        unchanged = subscription_cache.unchanged_guids(
+            snapshot, fingerprint, aqt.mw.col, check_decks=not config.ignore_deck_movement
+        )
+        deck_initializer.remove_notes(deck, unchanged)
+        record["count"] = len(unchanged)
+    cache_file = subscription_cache.cache_file_for(aqt.mw.col)
+
+    saved = []
+
+    def store_snapshot():
+        # Still in the background op that wrote the notes, so the next pull only starts once it's stored
+        subscription_cache.store(cache_file, snapshot, fingerprint, int(time.time()))
+
+    def on_notes_done():
+        if on_done:
+            on_done(bool(saved))
+
+    deck.save_to_collection(aqt.mw.col, import_config=config, on_done=on_notes_done,
+                            on_saved=lambda: saved.append(True), after_save=store_snapshot)
 
     # Handle Media
     if gdrive_folder != "":
         update_gdrive_data(subscription["deck_hash"], subscription["gdrive"])
-        api = GoogleDriveAPI(service_account=service_account, folder_id=gdrive_folder)
-        handle_media_import(deck.media_files, api)
+        api = get_drive_api(service_account=service_account, folder_id=gdrive_folder)
+        handle_media_import(deck.media_files, api, subscription["deck_hash"])
     else:
         aqt.mw.taskman.run_on_main(
             lambda: aqt.utils.tooltip(
@@ -281,7 +388,7 @@ def prep_config(protected_fields, optional_tags, has_optional_tags):
     return config
 
 
-def show_changelog_popup(subscription):
+def show_changelog_popup(subscription, on_done=None):
     changelog = subscription["changelog"]
     deck_hash = subscription["deck_hash"]
 
@@ -289,43 +396,116 @@ def show_changelog_popup(subscription):
     choice = dialog.exec()
 
     if choice == QDialog.DialogCode.Accepted:
-        install_update(subscription)
+        install_update(subscription, on_done)
         update_timestamp(deck_hash)
+        return
     elif choice == QDialog.DialogCode.Rejected:
         postpone_update()
+        handled = False
     else:
         abort_update(deck_hash)
+        handled = True  # this version is skipped on purpose
+    if on_done:
+        on_done(handled)
 
 
-def import_webresult(webresult, input_hash):
-    # if webresult is empty, make popup to tell user that there are no updates
-    if not webresult:
-        msg_box = QMessageBox()
-        msg_box.setWindowTitle("AnkiCollab")
-        msg_box.setText("You're already up-to-date!")
-        msg_box.exec()
-        return
-
-    # Create a backup for the user before updating!
-    aqt.mw.create_backup_now()
-
-    for subscription in webresult:
-        if input_hash:  # New deck
-            deck_name = install_update(subscription)
-            strings_data = mw.addonManager.getConfig(__name__)
-            for hash, details in strings_data.items():
-                if (
-                    hash == input_hash and details["deckId"] == 0
-                ):  # should only be the case once when they add a new subscription and never ambiguous
-                    details["deckId"] = aqt.mw.col.decks.id(deck_name)
-                    # large decks use cached data that may be a day old, so we need to update the timestamp to force a refresh
-                    details["timestamp"] = (
-                        datetime.now() - timedelta(days=1)
-                    ).strftime("%Y-%m-%d %H:%M:%S")
+def import_subscription(subscription, input_hash, on_done=None):
+    """`on_done(handled)` is called once the subscription is imported, skipped or failed to import."""
+    if input_hash:  # New deck
+        deck_name = install_update(subscription, on_done)
+        strings_data = mw.addonManager.getConfig(__name__)
+        for hash, details in strings_data.items():
+            if (
+                hash == input_hash and details["deckId"] == 0
+            ):  # should only be the case once when they add a new subscription and never ambiguous
+                details["deckId"] = aqt.mw.col.decks.id(deck_name)
+                # large decks use cached data that may be a day old, so we need to update the timestamp to force a refresh
+                details["timestamp"] = (
+                    datetime.now() - timedelta(days=1)
+                ).strftime("%Y-%m-%d %H:%M:%S")
 
-            mw.addonManager.writeConfig(__name__, strings_data)
-        else:  # Update deck
-            show_changelog_popup(subscription)
+        mw.addonManager.writeConfig(__name__, strings_data)
+    else:  # Update deck
+        show_changelog_popup(subscription, on_done)
+
+
+class SubscriptionImportQueue:
+    """
+    Imports pulled subscriptions on the main thread in the order they arrive.
+    The next subscription is only written once the notes of the previous one are in the collection.
+    """
+
+    def __init__(self, input_hash, quiet=False, on_finished=None, on_imported=None):
+        self.input_hash = input_hash
+        self.quiet = quiet
+        self.on_finished = on_finished
+        self.on_imported = on_imported
+        self.pending = deque()
+        self.importing = False
+        self.received_updates = False
+        self.backup_created = False
+        self.fetched = False
+        self.finished = False
+
+    def put(self, subscription):
+        self.received_updates = True
+        self.pending.append(subscription)
+        self._import_next()
+
+    def finish(self, failed_count=0):
+        """All subscriptions were fetched"""
+        self.fetched = True
+        self._check_finished()
+        if failed_count:
+            infot = "A Server Error occurred. Please notify us!"
+            aqt.utils.tooltip(infot, parent=QApplication.focusWidget())
+        elif not self.received_updates and not self.quiet:
+            # tell the user that there are no updates
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("AnkiCollab")
+            msg_box.setText("You're already up-to-date!")
+            msg_box.exec()
+
+    def _import_next(self):
+        if self.importing or not self.pending:
+            return
+        if not self.backup_created:
+            # Create a backup for the user before updating!
+            aqt.mw.create_backup_now()
+            self.backup_created = True
+        self.importing = True
+        subscription = self.pending.popleft()
+
+        def on_done(handled):
+            if handled and self.on_imported:
+                self.on_imported(subscription["deck_hash"])
+            self._on_imported()
+
+        try:
+            import_subscription(subscription, self.input_hash, on_done)
+        except Exception:
+            # Don't leave the queue (and with it every later pull) waiting for an import that never started
+            self._on_imported()
+            raise
+
+    def _on_imported(self):
+        self.importing = False
+        self._import_next()
+        self._check_finished()
+
+    def _check_finished(self):
+        if self.finished or not self.fetched or self.importing or self.pending:
+            return
+        self.finished = True
+        if self.on_finished:
+            self.on_finished()
+
+
+def import_webresult(webresult, input_hash, quiet=False):
+    queue = SubscriptionImportQueue(input_hash, quiet)
+    for subscription in webresult or []:
+        queue.put(subscription)
+    queue.finish()
 
 
 def remove_nonexistent_decks():
@@ -351,7 +531,9 @@ def remove_nonexistent_decks():
                 # we need to remove all the decks that don't exist anymore from the strings_data
                 strings_data = mw.addonManager.getConfig(__name__)
                 if strings_data is not None and len(strings_data) > 0:
+                    cache_file = subscription_cache.cache_file_for(mw.col)
                     for deck_hash in webresult:
+                        subscription_cache.forget(cache_file, deck_hash)
                         if deck_hash in strings_data:
                             del strings_data[deck_hash]
                         else:
@@ -362,34 +544,149 @@ def remove_nonexistent_decks():
 
 
 # Kinda ugly, but for backwards compatibility we need to handle both the old and new format
-def handle_pull(input_hash):
-    strings_data = mw.addonManager.getConfig(__name__)
-    if strings_data is not None and len(strings_data) > 0:
-        if "settings" in strings_data:
-            strings_data_copy = strings_data.copy()
-            del strings_data_copy["settings"]
-            strings_data_to_send = (
-                strings_data_copy
-                if input_hash is None
-                else {input_hash: strings_data_copy[input_hash]}
-            )
-        else:
-            strings_data_to_send = (
-                strings_data
-                if input_hash is None
-                else {input_hash: strings_data[input_hash]}
+# Only one pull runs at a time, e.g. not a manual "Check for new content" while the update checker pulls
+_pull_lock = threading.Lock()
+_pull_running = False
+
+
+def _start_pull() -> bool:
+    global _pull_running
+    with _pull_lock:
+        if _pull_running:
+            return False
+        _pull_running = True
+        return True
+
+
+def _pull_finished():
+    global _pull_running
+    with _pull_lock:
+        _pull_running = False
+    profiling.flush("pull")
+
+
+def handle_pull(input_hash, deck_hashes=None, quiet=False, on_imported=None):
+    """
+    Pull all subscriptions, only `input_hash` (a new subscription) or only the subscriptions in `deck_hashes`.
+    Refused while another pull is still fetching or importing. `on_imported(deck_hash)` is called on
+    the main thread for every subscription that was imported (or deliberately skipped).
+    """
+    if not _start_pull():
+        if not quiet:
+            aqt.mw.taskman.run_on_main(
+                lambda: aqt.utils.tooltip("AnkiCollab is already updating your decks, please wait until it's done.")
             )
+        return
 
-        response = requests.post(
-            "https://plugin.ankicollab.com/pullChanges", json=strings_data_to_send
-        )
-        if response.status_code == 200:
-            compressed_data = base64.b64decode(response.content)
-            decompressed_data = gzip.decompress(compressed_data)
-            webresult = json.loads(decompressed_data.decode("utf-8"))
-            aqt.mw.taskman.run_on_main(lambda: import_webresult(webresult, input_hash))
+    queue = None
+    failed_count = 0
+    try:
+        strings_data = mw.addonManager.getConfig(__name__)
+        if strings_data is not None and len(strings_data) > 0:
+            if "settings" in strings_data:
+                strings_data_copy = strings_data.copy()
+                del strings_data_copy["settings"]
+                strings_data_to_send = (
+                    strings_data_copy
+                    if input_hash is None
+                    else {input_hash: strings_data_copy[input_hash]}
+                )
+            else:
+                strings_data_to_send = (
+                    strings_data
+                    if input_hash is None
+                    else {input_hash: strings_data[input_hash]}
+                )
+            if deck_hashes is not None:
+                strings_data_to_send = {
+                    deck_hash: details
+                    for deck_hash, details in strings_data_to_send.items()
+                    if deck_hash in deck_hashes
+                }
+                if not strings_data_to_send:
+                    return
+
+            queue = SubscriptionImportQueue(input_hash, quiet, on_finished=_pull_finished, on_imported=on_imported)
+            cache_file = subscription_cache.cache_file_for(mw.col)
+            with ThreadPoolExecutor(max_workers=PULL_WORKERS) as executor:
+                futures = {
+                    executor.submit(fetch_subscription_update, deck_hash, details, cache_file): deck_hash
+                    for deck_hash, details in strings_data_to_send.items()
+                }
+                for future in as_completed(futures):
+                    try:
+                        webresult = future.result()
+                    except Exception as error:
+                        # A broken payload (bad base64, gzip or JSON) must not cost the other subscriptions their update
+                        print(f"[AnkiCollab] Pulling {futures[future]} failed: {error!r}")
+                        webresult = None
+                    if webresult is None:
+                        failed_count += 1
+                        continue
+                    for subscription in webresult:
+                        aqt.mw.taskman.run_on_main(lambda subscription=subscription: queue.put(subscription))
+    finally:
+        if queue is None:
+            _pull_finished()
         else:
-            infot = "A Server Error occurred. Please notify us!"
-            aqt.mw.taskman.run_on_main(
-                lambda: aqt.utils.tooltip(infot, parent=QApplication.focusWidget())
+            # The queue ends the pull once everything that was fetched is imported
+            aqt.mw.taskman.run_on_main(lambda: queue.finish(failed_count))
+
+
+def _pull_changes(deck_hash, details):
+    try:
+        with profiling.span("network") as record:
+            response = requests.post(PULL_URL, json={deck_hash: details})
+            record["count"] = len(response.content)
+    except requests.RequestException as error:
+        print(f"[AnkiCollab] Pulling {deck_hash} failed: {error}")
+        return None
+    if response.status_code != 200:
+        return None
+    with profiling.span("decompress", len(response.content)):
+        compressed_data = base64.b64decode(response.content)
+        decompressed_data = gzip.decompress(compressed_data)
+    with profiling.span("parse", len(decompressed_data)):
+        return json.loads(decompressed_data.decode("utf-8"))
+
+
+def fetch_subscription_update(deck_hash, details, cache_file=None):
+    """
+    Download and decode the update of a single subscription. Returns None on a server error.
+    With a `cache_file`, only the changes since the last applied payload are requested if the
+    server supports it, and applied to the cached payload.
+    """
+    base = subscription_cache.load_skeleton(cache_file, deck_hash) if cache_file is not None else None
+    request_details = delta_protocol.request_details(details, *base) if base is not None else details
+    fetched_at = time.time()
+    webresult = _pull_changes(deck_hash, request_details)
+    if webresult is None:
+        return None
+
+    if any(delta_protocol.is_delta(subscription) for subscription in webresult):
+        with profiling.span("delta", 0) as record:
+            base_payload = subscription_cache.load_payload(cache_file, deck_hash)
+            try:
+                if base_payload is None:
+                    raise delta_protocol.DeltaError("the cached payload is gone")
+                for subscription in webresult:
+                    if delta_protocol.is_delta(subscription):
+                        delta = subscription.pop("delta")
+                        record["count"] += len(delta.get("added", [])) + len(delta.get("modified", []))
+                        subscription["deck"] = delta_protocol.apply_delta(base_payload, delta)
+            except (delta_protocol.DeltaError, KeyError, TypeError) as error:
+                print(f"[AnkiCollab] Could not apply the changes to {deck_hash}, pulling everything: {error}")
+                # The subscriptions above may already be half converted, so ask again for the full payload
+                webresult = None
+        if webresult is None:
+            fetched_at = time.time()
+            webresult = _pull_changes(deck_hash, details)
+            if webresult is None:
+                return None
+
+    with profiling.span("snapshot"):
+        for subscription in webresult:
+            subscription["cache_snapshot"] = subscription_cache.take_snapshot(
+                subscription["deck_hash"], subscription["deck"], fetched_at
             )
+    return webresult
@@ -2,7 +2,6 @@
 import os
 import time
 import sys
-import importlib
 
 
 import sentry_sdk
@@ -14,16 +13,8 @@ sentry_sdk.init(
     # enable_tracing=True,
 )
 
-# Thanks to abdo for this fix
+# Vendored dependencies. The google package is only registered once a media action needs it (see google_drive_api)
 sys.path.append(os.path.join(os.path.dirname(__file__), "dist"))
-google_path = os.path.join(os.path.dirname(__file__), "dist", "google")
-source = os.path.join(google_path, "__init__.py")
-spec = importlib.util.spec_from_file_location(
-    "google", source, submodule_search_locations=[]
-)
-module = importlib.util.module_from_spec(spec)
-sys.modules["google"] = module
-spec.loader.exec_module(module)
 
 from aqt import mw
 from aqt.qt import *
@@ -21,6 +21,7 @@ from aqt.qt import *
 from aqt.utils import tooltip
 
 from .media_exporter import DeckMediaExporter, MediaExporter, NoteMediaExporter
+from .media_ingest import MediaCopier
 
 AUDIO_EXTS = aqt.editor.audio
 
@@ -39,18 +40,24 @@ def get_configured_search_field(config: dict[str, Any]) -> str | None:
     return config.get("search_in_field", None)
 
 
+def get_configured_hardlinks(config: dict[str, Any]) -> bool:
+    # Hard linked files share their content with the collection, so editing one changes both
+    return bool(config.get("settings", {}).get("export_hardlinks", False))
+
+
 def export_with_progress(
-    parent: QWidget, exporter: MediaExporter, note_count: int
+    parent: QWidget, exporter: MediaExporter, note_count: int, hardlinks: bool = False
 ) -> None:
     folder = get_export_folder(parent)
     if not folder:
         return
     want_cancel = False
+    copier = MediaCopier.for_folders(mw.col.media.dir(), folder, allow_hardlinks=hardlinks)
 
     def export_task() -> int:
         last_progress = 0.0
         media_i = 0
-        for notes_i, (media_i, _) in enumerate(exporter.export(folder)):
+        for notes_i, (media_i, _) in enumerate(exporter.export(folder, copier)):
             if time.time() - last_progress >= 0.1:
                 last_progress = time.time()
                 mw.taskman.run_on_main(
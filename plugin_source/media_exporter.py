@@ -6,97 +6,52 @@
 from __future__ import annotations
 
 import os
-import re
-from typing import List
-import shutil
 from abc import ABC, abstractmethod
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import Generator
 
 from anki.collection import Collection, SearchNode
 from anki.decks import DeckId
-from anki.notes import Note
-from anki.models import NotetypeDict, TemplateDict 
-
-
-def gather_media_from_css(css: str) -> List[str]:
-    # Regular expression taken from the anki repo https://github.com/ankitects/anki/blob/c2b1ab5eb06935e93aea6af09a224a99f4b971f0/rslib/src/text.rs#L151
-    underscored_css_imports_pattern = re.compile(r"""(?xi)
-        (?:@import\s+           # import statement with a bare
-            "(_[^"]*.css)"      # double quoted
-            |                   # or
-            '(_[^']*.css)'      # single quoted css filename
-        )
-        |
-        (?:url\(\s*             # a url function with a
-            "(_[^"]+)"          # double quoted
-            |                   # or
-            '(_[^']+)'          # single quoted
-            |                   # or
-            (_.+)               # unquoted filename
-        \s*\))
-    """)
-
-    media_files = []
-
-    matches = underscored_css_imports_pattern.findall(css)
-    for match in matches:
-        for group in match:
-            if group and group.startswith("_"):
-                media_files.append(group)
-
-    return media_files
-
-def gather_media_from_template_side(template_side: str) -> List[str]:
-    # Regular expression taken from the anki repo https://github.com/ankitects/anki/blob/c2b1ab5eb06935e93aea6af09a224a99f4b971f0/rslib/src/text.rs#L169
-    underscored_references_pattern = re.compile(r"""(?x)
-        \[sound:(_[^]]+)\]  # a filename in an Anki sound tag
-        |
-        "(_[^"]+)"          # a double quoted
-        |
-        '(_[^']+)'          # single quoted string
-        |
-        \b(?:src|data)      # a 'src' or 'data' attribute
-        =
-        (_[^ >]+)           # an unquoted value
-    """)
-
-    media_files = []
-
-    matches = underscored_references_pattern.findall(template_side)
-    for match in matches:
-        for group in match:
-            if group and group.startswith("_"):
-                media_files.append(group)
-
-    return media_files
-
-def gather_media_from_template(template: TemplateDict) -> List[str]:
-    question_template = template['qfmt']
-    answer_template = template['afmt']
-
-    media_files = gather_media_from_template_side(question_template)
-    media_files.extend(gather_media_from_template_side(answer_template))
-
-    return media_files
-
-def get_note_media(col: Collection, note: Note, field: str | None) -> list[str]:
-    "Return a list of used media files in `note`."
-    if field:
-        flds = note[field]
-    else:
-        flds = "".join(note.fields)
-    return col.media.files_in_str(note.mid, flds)
-
-def get_notetype_media(notetype: NotetypeDict) -> List[str]:
-    css_media = gather_media_from_css(notetype['css'])
-
-    template_media = []
-    for template in notetype['tmpls']:
-        template_media.extend(gather_media_from_template(template))
-
-    return css_media + template_media
-
+from anki.utils import ids2str
+
+from .media_ingest import INGEST_WORKERS, MediaCopier
+from .media_references import get_notetype_media
+
+
+SCAN_CHUNK_SIZE = 1000
+
+
+def scan_notes_media(
+    col: Collection, nids: list[int], field: str | None = None, chunk_size: int = SCAN_CHUNK_SIZE
+) -> Generator[list[tuple[int, list[str]]], None, None]:
+    """
+    Read the notes `nids` straight from the notes table, `chunk_size` at a time, and yield
+    the (notetype id, used media files) of every note in the chunk.
+    Only the field named `field` is searched if it's given.
+    """
+    field_ords: dict[int, int | None] = {}
+
+    def field_ord(mid: int) -> int | None:
+        if mid not in field_ords:
+            notetype = col.models.get(mid)
+            field_ords[mid] = next(
+                (fld["ord"] for fld in notetype["flds"] if fld["name"] == field), None
+            ) if notetype else None
+        return field_ords[mid]
+
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        results = []
+        for mid, flds in col.db.all(f"select mid, flds from notes where id in {ids2str(chunk)}"):
+            if field:
+                index = field_ord(mid)
+                fields = flds.split("\x1f")
+                flds = fields[index] if index is not None and index < len(fields) else ""
+            else:
+                flds = flds.replace("\x1f", "")
+            results.append((mid, col.media.files_in_str(mid, flds)))
+        yield results
 
 class MediaExporter(ABC):
     """Abstract media exporter."""
@@ -110,35 +65,70 @@ class MediaExporter(ABC):
         """Return a generator that yields a list of media files for each note that should be imported."""
 
     def export(
-        self, folder: Path | str
+        self, folder: Path | str, copier: MediaCopier | None = None
     ) -> Generator[tuple[int, list[str]], None, None]:
         """
         Export media files in `self.did` to `folder`,
         including only files that has extensions in `self.exts` if it's not None.
-        Returns a generator that yields the total media files exported so far and filenames as they are exported.
+        Files are copied in the background by `copier`, skipping those already in `folder` with the same content.
+        Returns a generator that yields the total media files exported so far and filenames as they are queued,
+        and finally the total once every copy finished.
         """
 
         media_dir = self.col.media.dir()
+        if copier is None:
+            copier = MediaCopier.for_folders(media_dir, str(folder))
         seen = set()
-        exported = set()
-        for filenames in self.file_lists():
-            for filename in filenames:
-                if filename in seen:
-                    continue
-                seen.add(filename)
-                if (
-                    self.exts is not None
-                    and os.path.splitext(filename)[1][1:] not in self.exts
-                ):
-                    continue
-                src_path = os.path.join(media_dir, filename)
-                if not os.path.exists(src_path):
-                    continue
-                dest_path = os.path.join(folder, filename)
-                shutil.copyfile(src_path, dest_path)
-                exported.add(filename)
-            yield len(exported), filenames
+        exported: list[str] = []
+
+        def export_file(filename: str) -> None:
+            try:
+                copier.copy_if_changed(
+                    os.path.join(media_dir, filename), os.path.join(folder, filename)
+                )
+            except FileNotFoundError:  # referenced, but not in the media folder
+                return
+            except OSError as error:
+                print(f"[AnkiCollab] Could not export {filename}: {error}")
+                return
+            exported.append(filename)
+
+        executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS)
+        try:
+            for filenames in self.file_lists():
+                for filename in filenames:
+                    if filename in seen:
+                        continue
+                    seen.add(filename)
+                    if (
+                        self.exts is not None
+                        and os.path.splitext(filename)[1][1:] not in self.exts
+                    ):
+                        continue
+                    executor.submit(export_file, filename)
+                yield len(exported), filenames
+            executor.shutdown(wait=True)
+            yield len(exported), []
+        finally:
+            # Stops queued copies if the caller stopped iterating early (e.g. the export was cancelled)
+            executor.shutdown(wait=True, cancel_futures=True)
             
+    def notes_file_lists(self, nids: list[int]) -> Generator[list[str], None, None]:
+        """
+        Yield the media files of each note in `nids`, then those of their note types.
+        Notes are read in chunks, so only one chunk is in memory at a time.
+        """
+        notetypes = set()
+        for chunk in scan_notes_media(self.col, nids, self.field):
+            for mid, filenames in chunk:
+                notetypes.add(mid)
+                yield filenames
+
+        for mid in notetypes:
+            notetype = self.col.models.get(mid)
+            if notetype:
+                yield get_notetype_media(notetype)
+
     def get_list_of_media(self):
         """
         Return a list of media files used by the deck.
@@ -159,30 +149,18 @@ class NoteMediaExporter(MediaExporter):
     def __init__(
         self,
         col: Collection,
-        notes: list[Note],
+        nids: list[int],
         field: str | None = None,
         exts: set | None = None,
     ):
         self.col = col
-        self.notes = notes
+        self.nids = nids
         self.field = field
         self.exts = exts
 
     def file_lists(self) -> Generator[list[str], None, None]:
-        "Return a generator that yields a list of media files for each note in `self.notes`"
-
-        notetypes_in_selection = set()
-        for note in self.notes:
-            notetypes_in_selection.add(note.note_type()['name'])
-            yield get_note_media(self.col, note, self.field)
-
-        get_notetype_by_name = getattr(self.col.models, "by_name", None)
-        if not get_notetype_by_name:
-            get_notetype_by_name = self.col.models.byName  # type: ignore[attr-defined]
-            
-        for notetype_name in notetypes_in_selection:
-            notetype = get_notetype_by_name(notetype_name)
-            yield get_notetype_media(notetype)
+        "Return a generator that yields a list of media files for each note in `self.nids`"
+        return self.notes_file_lists(self.nids)
 
 class DeckMediaExporter(MediaExporter):
     "Exporter for all media in a deck."
@@ -206,16 +184,4 @@ class DeckMediaExporter(MediaExporter):
             search_params.append(SearchNode(field_name=self.field))
         search = self.col.build_search_string(*search_params)
         
-        notetypes_in_deck = set()
-        for nid in self.col.find_notes(search):
-            note = self.col.get_note(nid)
-            notetypes_in_deck.add(note.note_type()['name'])
-            yield get_note_media(self.col, note, self.field)
-
-        get_notetype_by_name = getattr(self.col.models, "by_name", None)
-        if not get_notetype_by_name:
-            get_notetype_by_name = self.col.models.byName  # type: ignore[attr-defined]
-            
-        for notetype_name in notetypes_in_deck:
-            notetype = get_notetype_by_name(notetype_name)
-            yield get_notetype_media(notetype)
+        return self.notes_file_lists(list(self.col.find_notes(search)))
@@ -1,5 +1,4 @@
 import os
-import shutil
 from typing import Optional
 
 import aqt
@@ -10,28 +9,32 @@ from aqt.operations import QueryOp
 from aqt.qt import *
 from aqt import mw
 
+from .media_ingest import IngestResult, collect_files, ingest, main_window_progress, register_media_files, wants_full_media_check
+
 try:
     from anki.utils import is_win, is_lin
 except ImportError:
     from anki.utils import isWin as is_win
     from anki.utils import isLin as is_lin
 
-def copy_content(input_path: str) -> None:
-    counter = 0
-    if os.path.isdir(input_path):
-        for root, dirs, files in os.walk(input_path):
-            for file in files:
-                src_path = os.path.join(root, file)
-                dst_path = os.path.join(mw.col.media.dir(), file)
-                shutil.copy2(src_path, dst_path)
-                counter += 1
-    return counter
+def copy_content(input_path: str) -> IngestResult:
+    media_dir = mw.col.media.dir()
+    files = collect_files(input_path) if os.path.isdir(input_path) else {}
+    result = ingest(files, media_dir, progress=main_window_progress("Importing media: {processed} of {total} files"))
+    register_media_files(mw.col, result.copied)
+    return result
                 
 
-def on_success(count: int) -> None:
-    mw.col.media.check()
+def on_success(result: IngestResult) -> None:
+    if wants_full_media_check():
+        mw.col.media.check()
     mw.progress.finish()
-    aqt.utils.showInfo(f"AnkiCollab: {count} Media Files imported.")
+    message = f"AnkiCollab: {len(result.copied)} Media Files imported, {len(result.skipped)} were already present."
+    if result.failed:
+        message += f"\n{len(result.failed)} files could not be copied:\n" + "\n".join(
+            f"{name}: {error}" for name, error in list(result.failed.items())[:10]
+        )
+    aqt.utils.showInfo(message)
         
 def import_media(path: str):
     op = QueryOp(
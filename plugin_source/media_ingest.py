@@ -0,0 +1,245 @@
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from aqt import mw
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INGEST_WORKERS = 8
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ioctl(dst, FICLONE, src) shares the source's blocks on btrfs, xfs and friends (Linux only)
+FICLONE = 0x40049409
+# Errors that mean "this filesystem (pair) can't do that", not that the file is broken
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.ENOSYS}
+
+
+@dataclass
+class IngestResult:
+    copied: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def processed(self) -> int:
+        return len(self.copied) + len(self.skipped) + len(self.failed)
+
+
+def collect_files(input_path: str, exts: Optional[set] = None, recursive: bool = True) -> Dict[str, str]:
+    """
+    Map destination file name -> source path for every file below input_path (or only directly
+    in it, if not `recursive`). Media folders are flat, so files with the same name in different
+    subfolders collapse into one entry (the last one found wins, like copying them one after another would).
+    """
+    files = {}
+    pending = [input_path]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError as error:
+            print(f"[AnkiCollab] Could not read {error.filename}: {error}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    pending.append(entry.path)
+            elif entry.is_file():
+                if exts is not None and os.path.splitext(entry.name)[1][1:].lower() not in exts:
+                    continue
+                files[entry.name] = entry.path
+    return files
+
+
+def file_hash(path: str) -> str:
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def same_content(src: str, dst: str) -> bool:
+    """
+    True if dst already holds the content of src: it is the same file (a hard link), or sizes
+    match and either the exact modification times (copy2 and clones keep them) or the hashes do.
+    Only files with different modification times are read, so re-exports skip unchanged media cheaply.
+    """
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    src_stat = os.stat(src)
+    if os.path.samestat(src_stat, dst_stat):
+        return True
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    return file_hash(src) == file_hash(dst)
+
+
+class MediaCopier:
+    """
+    Copies files, cloning (reflink) them where the filesystem supports it. Hard links are
+    only used if explicitly allowed, as editing either file would then change both.
+    Each technique is switched off after the first time the filesystem refuses it. Files are
+    written next to the destination first and then moved over it, so an interrupted copy never
+    leaves a truncated file (or none at all) under the destination name.
+    """
+
+    def __init__(self, allow_hardlinks: bool = False, allow_reflinks: bool = True):
+        self.use_reflinks = allow_reflinks and fcntl is not None and sys.platform.startswith("linux")
+        self.use_hardlinks = allow_hardlinks
+
+    @classmethod
+    def for_folders(cls, src_dir: str, dest_dir: str, allow_hardlinks: bool = False) -> "MediaCopier":
+        """Only try links and clones if both folders are on the same filesystem, where they can work."""
+        try:
+            same_device = os.stat(src_dir).st_dev == os.stat(dest_dir).st_dev
+        except OSError:
+            same_device = False
+        return cls(allow_hardlinks=allow_hardlinks and same_device, allow_reflinks=same_device)
+
+    def _reflink(self, src: str, dst: str) -> bool:
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError as error:
+            if os.path.exists(dst):
+                os.remove(dst)
+            if error.errno in UNSUPPORTED_ERRNOS:
+                self.use_reflinks = False
+                return False
+            raise
+        shutil.copystat(src, dst)
+        return True
+
+    def _hardlink(self, src: str, dst: str) -> bool:
+        try:
+            os.link(src, dst)
+        except OSError as error:
+            if error.errno in UNSUPPORTED_ERRNOS:
+                self.use_hardlinks = False
+                return False
+            raise
+        return True
+
+    def _copy_to(self, src: str, dst: str) -> None:
+        if self.use_reflinks and self._reflink(src, dst):
+            return
+        if self.use_hardlinks and self._hardlink(src, dst):
+            return
+        shutil.copy2(src, dst)
+
+    def copy(self, src: str, dst: str) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(dst) or ".", prefix=".ankicollab-", suffix=".tmp")
+        os.close(fd)
+        try:
+            # Links can't replace an existing file
+            os.remove(temp_path)
+            self._copy_to(src, temp_path)
+            os.replace(temp_path, dst)
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def copy_if_changed(self, src: str, dst: str) -> bool:
+        """Copy src to dst unless dst already has the same content. Returns whether it copied."""
+        if same_content(src, dst):
+            return False
+        self.copy(src, dst)
+        return True
+
+
+def ingest(
+    files: Dict[str, str],
+    dest_dir: str,
+    copier: Optional[MediaCopier] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    workers: int = INGEST_WORKERS,
+) -> IngestResult:
+    """
+    Copy files (destination name -> source path) into dest_dir in parallel, skipping those
+    already present with the same content. progress(processed, total) is called from the
+    calling thread after every file.
+    """
+    copier = copier or MediaCopier()
+    result = IngestResult()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(copier.copy_if_changed, src, os.path.join(dest_dir, name)): name
+            for name, src in files.items()
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                (result.copied if future.result() else result.skipped).append(name)
+            except OSError as error:
+                result.failed[name] = str(error)
+            if progress is not None:
+                progress(result.processed, len(files))
+    return result
+
+
+def main_window_progress(label: str, interval: float = 0.1) -> Callable[[int, int], None]:
+    """
+    A progress(processed, total) callback for `ingest` that shows `label` (formatted with
+    processed and total) in Anki's progress window, at most every `interval` seconds.
+    """
+    last_update = 0.0
+
+    def update_progress(processed: int, total: int) -> None:
+        nonlocal last_update
+        if time.time() - last_update < interval and processed < total:
+            return
+        last_update = time.time()
+        mw.taskman.run_on_main(
+            lambda: mw.progress.update(
+                label=label.format(processed=processed, total=total),
+                value=processed,
+                max=total,
+            )
+        )
+
+    return update_progress
+
+
+def register_media_files(col, names: Iterable[str]) -> int:
+    """
+    Add files the add-on just wrote into the media folder to the media database, so they sync
+    without a full Check Media. Anki keeps a file that already has the same name and content
+    in place, so this only costs reading the files.
+    """
+    media_dir = col.media.dir()
+    registered = 0
+    for name in names:
+        try:
+            with open(os.path.join(media_dir, name), "rb") as file:
+                data = file.read()
+            col.media.write_data(name, data)
+            registered += 1
+        except OSError as error:
+            print(f"[AnkiCollab] Could not register {name}: {error}")
+    return registered
+
+
+def wants_full_media_check() -> bool:
+    """The full Check Media scans every file and note in the collection, so it is opt-in."""
+    strings_data = mw.addonManager.getConfig(__name__)
+    return bool(
+        strings_data is not None
+        and strings_data.get("settings", {}).get("full_media_check", False)
+    )
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .crowd_anki.utils.constants import ADDON_USER_FILES_PATH
+from .media_ingest import HASH_CHUNK_SIZE
+
+MANIFEST_DIR = ADDON_USER_FILES_PATH.joinpath("media_manifests")
+# Below this many names, stat'ing them is cheaper than listing the media folder
+DIRECT_STAT_LIMIT = 256
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    md5: Optional[str]
+
+
+def file_md5(path: str) -> str:
+    # md5 because that's what Google Drive reports as md5Checksum
+    md5 = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class MediaManifest:
+    """
+    What we know about the media files of one subscription in the local media folder:
+    name -> size, mtime and md5. Looking files up costs one pass over the media folder: files
+    that are gone are dropped, and files whose size or mtime changed lose their recorded hash.
+    `refresh(..., verify=True)` also hashes the known files and treats files that no longer
+    match their recorded hash as missing, so damaged or partial downloads get fetched again.
+    """
+
+    def __init__(self, deck_hash: str, media_dir: str):
+        self.deck_hash = deck_hash
+        self.media_dir = media_dir
+        self.path = MANIFEST_DIR.joinpath(f"{deck_hash}.json")
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.lock = threading.RLock()
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with self.path.open("r", encoding="utf8") as manifest_file:
+                data = json.load(manifest_file)
+        except (OSError, ValueError):
+            return
+        if data.get("media_dir") != self.media_dir:  # e.g. another profile
+            return
+        self.entries = {name: ManifestEntry(*entry) for name, entry in data.get("files", {}).items()}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {
+                "media_dir": self.media_dir,
+                "files": {name: [entry.size, entry.mtime_ns, entry.md5] for name, entry in self.entries.items()},
+            }
+            self.dirty = False
+        try:
+            MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with tmp_path.open("w", encoding="utf8") as manifest_file:
+                json.dump(data, manifest_file)
+            os.replace(tmp_path, self.path)
+        except OSError as error:
+            print(f"[AnkiCollab] Could not save the media manifest: {error}")
+
+    def _scan(self, names: Set[str]) -> Dict[str, os.stat_result]:
+        """
+        Stats of those of `names` that exist. Many names are looked up in one pass over the media
+        folder (where listing includes the stats on Windows), a few are stat'ed directly.
+        """
+        stats = {}
+        if len(names) < DIRECT_STAT_LIMIT:
+            for name in names:
+                try:
+                    stats[name] = os.stat(os.path.join(self.media_dir, name))
+                except OSError:
+                    pass
+            return stats
+        try:
+            with os.scandir(self.media_dir) as entries:
+                for entry in entries:
+                    if entry.name in names:
+                        try:
+                            stats[entry.name] = entry.stat()
+                        except OSError:
+                            pass
+        except OSError as error:
+            print(f"[AnkiCollab] Could not read the media folder: {error}")
+        return stats
+
+    def _update(self, name: str, stat: Optional[os.stat_result], expected_md5: Optional[str] = None,
+                verify: bool = False, hash_file: bool = False) -> None:
+        if stat is None:
+            # Deleted, e.g. by the user or Check Media
+            if self.entries.pop(name, None) is not None:
+                self.dirty = True
+            return
+
+        entry = self.entries.get(name)
+        unchanged = entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns
+        if unchanged and not (verify or hash_file or expected_md5):
+            return
+        self.dirty = True
+        if not (verify or hash_file or expected_md5):
+            # Hashed when it's verified, so looking up a new or changed file only costs a stat
+            self.entries[name] = ManifestEntry(stat.st_size, stat.st_mtime_ns, None)
+            return
+
+        path = os.path.join(self.media_dir, name)
+        actual_md5 = file_md5(path)
+        if expected_md5 is not None and actual_md5 != expected_md5:
+            # Not the file we expected, e.g. a partial download
+            self.entries.pop(name, None)
+        elif verify and entry is not None and entry.md5 is not None and actual_md5 != entry.md5:
+            # No longer the file we downloaded
+            del self.entries[name]
+        else:
+            self.entries[name] = ManifestEntry(stat.st_size, stat.st_mtime_ns, actual_md5)
+
+    def refresh(self, names: Iterable[str], verify: bool = False) -> None:
+        """
+        Bring the entries of `names` up to date with the media folder: files that are gone are dropped,
+        new or changed ones are recorded (unhashed). With `verify`, the known files are hashed as well.
+        """
+        names = set(names)
+        stats = self._scan(names)
+        with self.lock:
+            for name in names:
+                self._update(name, stats.get(name), verify=verify)
+
+    def record(self, expected: Dict[str, Optional[str]]) -> None:
+        """Add files that were just written, name -> expected md5 (or None if unknown)."""
+        stats = self._scan(set(expected))
+        with self.lock:
+            for name, md5 in expected.items():
+                self._update(name, stats.get(name), expected_md5=md5, hash_file=True)
+
+    def missing(self, names: Iterable[str], verify: bool = False) -> Set[str]:
+        names = set(names)
+        self.refresh(names, verify)
+        with self.lock:
+            return names - self.entries.keys()
+
+    def present(self, names: Iterable[str]) -> Set[str]:
+        names = set(names)
+        self.refresh(names)
+        with self.lock:
+            return names & self.entries.keys()
+
+    def diff_remote(self, remote: Dict[str, Optional[str]]) -> Tuple[Set[str], Set[str], Set[str]]:
+        """
+        Compare with a remote listing (name -> md5, None if unknown), without touching the disk.
+        Returns the names only remote, the names only local and the names whose content differs.
+        """
+        with self.lock:
+            local_names = self.entries.keys()
+            remote_names = remote.keys()
+            changed = {
+                name for name in local_names & remote_names
+                if remote[name] is not None
+                and self.entries[name].md5 is not None
+                and remote[name] != self.entries[name].md5
+            }
+            return set(remote_names - local_names), set(local_names - remote_names), changed
+
+
+_manifests: Dict[Tuple[str, str], MediaManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_media_manifest(deck_hash: str, media_dir: str) -> MediaManifest:
+    with _manifests_lock:
+        key = (deck_hash, media_dir)
+        if key not in _manifests:
+            _manifests[key] = MediaManifest(deck_hash, media_dir)
+        return _manifests[key]
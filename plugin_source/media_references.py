@@ -0,0 +1,95 @@
+"""Media files referenced by note types (css and templates), extracted the way Anki does."""
+
+import hashlib
+import re
+import threading
+from typing import Dict, List, Tuple
+
+# Regular expression taken from the anki repo https://github.com/ankitects/anki/blob/c2b1ab5eb06935e93aea6af09a224a99f4b971f0/rslib/src/text.rs#L151
+UNDERSCORED_CSS_IMPORTS_PATTERN = re.compile(r"""(?xi)
+    (?:@import\s+           # import statement with a bare
+        "(_[^"]*.css)"      # double quoted
+        |                   # or
+        '(_[^']*.css)'      # single quoted css filename
+    )
+    |
+    (?:url\(\s*             # a url function with a
+        "(_[^"]+)"          # double quoted
+        |                   # or
+        '(_[^']+)'          # single quoted
+        |                   # or
+        (_.+)               # unquoted filename
+    \s*\))
+""")
+
+# Regular expression taken from the anki repo https://github.com/ankitects/anki/blob/c2b1ab5eb06935e93aea6af09a224a99f4b971f0/rslib/src/text.rs#L169
+UNDERSCORED_REFERENCES_PATTERN = re.compile(r"""(?x)
+    \[sound:(_[^]]+)\]  # a filename in an Anki sound tag
+    |
+    "(_[^"]+)"          # a double quoted
+    |
+    '(_[^']+)'          # single quoted string
+    |
+    \b(?:src|data)      # a 'src' or 'data' attribute
+    =
+    (_[^ >]+)           # an unquoted value
+""")
+
+# notetype id -> (hash of css and templates, media files). Not keyed on mod, as updates may keep it.
+_notetype_cache: Dict[int, Tuple[str, Tuple[str, ...]]] = {}
+_cache_lock = threading.Lock()
+
+
+def _underscored_matches(pattern, text: str) -> List[str]:
+    return [
+        group
+        for match in pattern.findall(text)
+        for group in match
+        if group and group.startswith("_")
+    ]
+
+
+def gather_media_from_css(css: str) -> List[str]:
+    return _underscored_matches(UNDERSCORED_CSS_IMPORTS_PATTERN, css)
+
+
+def gather_media_from_template_side(template_side: str) -> List[str]:
+    return _underscored_matches(UNDERSCORED_REFERENCES_PATTERN, template_side)
+
+
+def gather_media_from_template(template) -> List[str]:
+    media_files = gather_media_from_template_side(template['qfmt'])
+    media_files.extend(gather_media_from_template_side(template['afmt']))
+    return media_files
+
+
+def _scan_notetype(notetype) -> List[str]:
+    media_files = gather_media_from_css(notetype['css'])
+    for template in notetype['tmpls']:
+        media_files.extend(gather_media_from_template(template))
+    return media_files
+
+
+def _notetype_content_hash(notetype) -> str:
+    sha1 = hashlib.sha1(notetype['css'].encode("utf8"))
+    for template in notetype['tmpls']:
+        sha1.update(b"\x1e" + template['qfmt'].encode("utf8") + b"\x1f" + template['afmt'].encode("utf8"))
+    return sha1.hexdigest()
+
+
+def get_notetype_media(notetype) -> List[str]:
+    """Media files used by the css and templates of `notetype`, cached per note type until they change."""
+    notetype_id = notetype.get('id')
+    if not notetype_id:  # not (yet) stored in a collection
+        return _scan_notetype(notetype)
+
+    content_hash = _notetype_content_hash(notetype)
+    with _cache_lock:
+        cached = _notetype_cache.get(notetype_id)
+    if cached is not None and cached[0] == content_hash:
+        return list(cached[1])
+
+    media_files = _scan_notetype(notetype)
+    with _cache_lock:
+        _notetype_cache[notetype_id] = (content_hash, tuple(media_files))
+    return media_files
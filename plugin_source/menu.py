@@ -10,11 +10,15 @@ from .export_manager import *
 from .import_manager import *
 
 from .media_import import on_media_btn
-from .hooks import onProfileLoaded
+from .hooks import on_check_for_new_content
 from .dialogs import LoginDialog
+from . import profiling
+from . import subscription_cache
 
 pull_on_startup_action = QAction('Check for Updates on Startup', mw)
 auto_approve_action = QAction('Auto Approve Changes (Maintainer only)', mw)
+profiling_action = QAction('Record Performance Timings', mw)
+full_media_check_action = QAction('Full Media Check After Media Imports', mw)
 login_manager_action = QAction('Logout', mw)
 collab_menu = QMenu('AnkiCollab', mw)
 settings_menu = QMenu('Settings', mw)
@@ -25,6 +29,8 @@ settings_menu.menuAction().setMenuRole(QAction.MenuRole.NoRole)
 # Also set this for the settings menu actions to be safe.
 pull_on_startup_action.setMenuRole(QAction.MenuRole.NoRole)
 auto_approve_action.setMenuRole(QAction.MenuRole.NoRole)
+profiling_action.setMenuRole(QAction.MenuRole.NoRole)
+full_media_check_action.setMenuRole(QAction.MenuRole.NoRole)
 
 def add_maintainer_checkbox():
     strings_data = mw.addonManager.getConfig(__name__)
@@ -51,6 +57,7 @@ def delete_selected_rows(table):
             deck_hash = table.item(row, 0).text()
             requests.get("https://plugin.ankicollab.com/RemoveSubscription/" + deck_hash)      
             strings_data.pop(deck_hash)
+            subscription_cache.forget(subscription_cache.cache_file_for(mw.col), deck_hash)
     for row in reversed(selected_rows):
         table.removeRow(row)
     mw.addonManager.writeConfig(__name__, strings_data)
@@ -268,8 +275,31 @@ def store_default_config():
             strings_data["settings"]["auto_approve"] = False
         if "pull_on_startup" not in strings_data["settings"]:
             strings_data["settings"]["pull_on_startup"] = False
+        if "profiling" not in strings_data["settings"]:
+            strings_data["settings"]["profiling"] = False
+        if "full_media_check" not in strings_data["settings"]:
+            strings_data["settings"]["full_media_check"] = False
+        if "export_hardlinks" not in strings_data["settings"]:
+            strings_data["settings"]["export_hardlinks"] = False
     mw.addonManager.writeConfig(__name__, strings_data)
        
+def write_setting(name, value):
+    strings_data = mw.addonManager.getConfig(__name__)
+    if "settings" not in strings_data:
+        strings_data["settings"] = {}
+    strings_data["settings"][name] = value
+    mw.addonManager.writeConfig(__name__, strings_data)
+
+def toggle_startup_pull(checked):
+    write_setting("pull_on_startup", checked)
+
+def toggle_profiling(checked):
+    write_setting("profiling", checked)
+    profiling.set_enabled(checked)
+
+def toggle_full_media_check(checked):
+    write_setting("full_media_check", checked)
+
 def menu_init():                
     mw.form.menubar.addMenu(collab_menu)
     store_default_config()
@@ -296,20 +326,27 @@ def menu_init():
             pull_on_startup_action.setCheckable(True)
             pull_on_startup_action.setChecked(bool(strings_data["settings"]["pull_on_startup"]))
 
+        if "settings" in strings_data and "profiling" in strings_data["settings"]:
+            profiling_action.setCheckable(True)
+            profiling_action.setChecked(bool(strings_data["settings"]["profiling"]))
+
+        if "settings" in strings_data and "full_media_check" in strings_data["settings"]:
+            full_media_check_action.setCheckable(True)
+            full_media_check_action.setChecked(bool(strings_data["settings"]["full_media_check"]))
+
     collab_menu.addAction(login_manager_action)
 
     media_import_action = QAction('Import Media from Folder', mw)
     collab_menu.addAction(media_import_action)
 
-    def toggle_startup_pull(checked):
-        strings_data = mw.addonManager.getConfig(__name__)
-        if "settings" not in strings_data:
-            strings_data["settings"] = {}
-        strings_data["settings"]["pull_on_startup"] = checked
-        mw.addonManager.writeConfig(__name__, strings_data)
-
     pull_on_startup_action.triggered.connect(toggle_startup_pull)
     settings_menu.addAction(pull_on_startup_action)
+
+    profiling_action.triggered.connect(toggle_profiling)
+    settings_menu.addAction(profiling_action)
+
+    full_media_check_action.triggered.connect(toggle_full_media_check)
+    settings_menu.addAction(full_media_check_action)
             
     collab_menu.addMenu(settings_menu)
     
@@ -327,7 +364,7 @@ def menu_init():
     
     edit_list_action.triggered.connect(on_edit_list)
     push_deck_action.triggered.connect(on_push_deck_action)
-    pull_changes_action.triggered.connect(onProfileLoaded)
+    pull_changes_action.triggered.connect(on_check_for_new_content)
     media_import_action.triggered.connect(on_media_btn)
     website_action.triggered.connect(open_website)
     donation_action.triggered.connect(open_donation_site)
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import aqt
+import aqt.utils
+from aqt import mw
+
+from .crowd_anki.utils.constants import ADDON_USER_FILES_PATH
+
+PROFILE_FILE = ADDON_USER_FILES_PATH.joinpath("profiling.jsonl")
+MAX_PROFILE_FILE_SIZE = 1024 * 1024
+PROFILE_BACKUP_COUNT = 3
+
+_enabled = None
+_lock = threading.Lock()
+_records = []
+
+
+def is_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        strings_data = mw.addonManager.getConfig(__name__)
+        _enabled = bool(
+            strings_data is not None
+            and strings_data.get("settings", {}).get("profiling", False)
+        )
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+@contextmanager
+def span(name, count=None):
+    """
+    Time the enclosed block as `name`. The yielded dict is the record, so the
+    number of processed items can still be set as record["count"] inside the block.
+    Does nothing unless profiling is enabled in the settings.
+    """
+    record = {"span": name, "count": count}
+    if not is_enabled():
+        yield record
+        return
+
+    record["thread"] = threading.current_thread().name
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["duration"] = round(time.perf_counter() - start, 6)
+        record["time"] = time.time()
+        with _lock:
+            _records.append(record)
+
+
+def _rotate():
+    if not PROFILE_FILE.exists() or PROFILE_FILE.stat().st_size < MAX_PROFILE_FILE_SIZE:
+        return
+    for i in range(PROFILE_BACKUP_COUNT - 1, 0, -1):
+        older = PROFILE_FILE.with_name(f"{PROFILE_FILE.name}.{i}")
+        if older.exists():
+            os.replace(older, PROFILE_FILE.with_name(f"{PROFILE_FILE.name}.{i + 1}"))
+    os.replace(PROFILE_FILE, PROFILE_FILE.with_name(f"{PROFILE_FILE.name}.1"))
+
+
+def summarize(records) -> str:
+    totals = defaultdict(lambda: [0, 0.0, 0])
+    for record in records:
+        total = totals[record["span"]]
+        total[0] += 1
+        total[1] += record["duration"]
+        total[2] += record["count"] or 0
+    lines = []
+    for name, (calls, duration, count) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        line = f"{name}: {duration:.2f}s"
+        if calls > 1:
+            line += f" ({calls}x)"
+        if count:
+            line += f", {count} items"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def flush(operation: str) -> None:
+    """Append the spans recorded since the last flush to the profiling file and show a summary tooltip."""
+    with _lock:
+        records = list(_records)
+        _records.clear()
+    if not records:
+        return
+
+    try:
+        ADDON_USER_FILES_PATH.mkdir(parents=True, exist_ok=True)
+        _rotate()
+        with PROFILE_FILE.open("a", encoding="utf8") as profile_file:
+            for record in records:
+                profile_file.write(json.dumps({"operation": operation, **record}) + "\n")
+    except OSError as error:
+        print(f"[AnkiCollab] Could not write timings: {error}")
+
+    summary = f"AnkiCollab {operation} timings:\n{summarize(records)}"
+    mw.taskman.run_on_main(lambda: aqt.utils.tooltip(summary, period=8000))
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from .crowd_anki.utils.constants import ADDON_USER_FILES_PATH, UUID_FIELD_NAME
+
+# SQLite limits the number of bound parameters per query
+GUID_CHUNK_SIZE = 500
+
+SCHEMA = """
+create table if not exists subscriptions (
+    deck_hash text primary key,
+    applied_at integer not null,
+    config_fingerprint text not null,
+    skeleton blob not null,
+    fetched_at real not null default 0
+);
+create table if not exists notes (
+    deck_hash text not null,
+    guid text not null,
+    deck_uuid text not null,
+    position integer not null,
+    hash text not null,
+    payload blob not null,
+    primary key (deck_hash, guid)
+) without rowid;
+"""
+
+_lock = threading.Lock()
+
+
+@dataclass
+class SubscriptionSnapshot:
+    """A deck payload as received from the server: the deck tree without notes, and the notes by guid."""
+    deck_hash: str
+    skeleton: bytes
+    # When the payload was requested, the base of the next delta pull
+    fetched_at: float = 0.0
+    # guid -> (deck uuid, content hash, compressed note json)
+    notes: Dict[str, Tuple[str, str, bytes]] = field(default_factory=dict)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def take_snapshot(deck_hash: str, deck_json: dict, fetched_at: float = 0.0) -> SubscriptionSnapshot:
+    """Must be taken before the payload is imported, as importing changes the note dicts."""
+    snapshot = SubscriptionSnapshot(deck_hash, b"", fetched_at)
+
+    def strip_notes(deck):
+        deck_uuid = deck.get("crowdanki_uuid", "")
+        for note in deck.get("notes", []):
+            note_json = _dumps(note)
+            content_hash = hashlib.sha1(f"{deck_uuid}\x1f{note_json}".encode("utf8")).hexdigest()
+            snapshot.notes[note["guid"]] = (deck_uuid, content_hash, zlib.compress(note_json.encode("utf8")))
+        skeleton = {key: value for key, value in deck.items() if key not in ("notes", "children")}
+        skeleton["children"] = [strip_notes(child) for child in deck.get("children", [])]
+        return skeleton
+
+    snapshot.skeleton = zlib.compress(_dumps(strip_notes(deck_json)).encode("utf8"))
+    return snapshot
+
+
+def config_fingerprint(protected_fields, optional_tags, has_optional_tags, ignore_deck_movement) -> str:
+    """The import settings change how notes are written, so cached notes are only trusted under the same ones."""
+    return hashlib.sha1(_dumps(
+        [protected_fields, sorted(optional_tags), has_optional_tags, ignore_deck_movement]
+    ).encode("utf8")).hexdigest()
+
+
+def cache_file_for(collection) -> Path:
+    """One cache per collection, as every profile applies its subscriptions separately."""
+    collection_key = hashlib.sha1(str(collection.path).encode("utf8")).hexdigest()[:16]
+    return ADDON_USER_FILES_PATH.joinpath(f"subscriptions-{collection_key}.sqlite")
+
+
+def _connect(cache_file: Path):
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(str(cache_file), timeout=30)
+    connection.executescript(SCHEMA)
+    columns = {row[1] for row in connection.execute("pragma table_info(subscriptions)")}
+    if "fetched_at" not in columns:  # caches written before delta pulls
+        connection.execute("alter table subscriptions add column fetched_at real not null default 0")
+    return connection
+
+
+def _locally_unmodified(collection, guids, applied_at) -> Set[str]:
+    unmodified = set()
+    guids = list(guids)
+    for start in range(0, len(guids), GUID_CHUNK_SIZE):
+        chunk = guids[start:start + GUID_CHUNK_SIZE]
+        unmodified.update(collection.db.list(
+            f"select guid from notes where guid in ({','.join('?' * len(chunk))}) and mod <= ?",
+            *chunk, applied_at))
+    return unmodified
+
+
+def _in_their_decks(collection, snapshot: SubscriptionSnapshot, guids) -> Set[str]:
+    """The notes whose cards are all (or, in a filtered deck, belong) in the deck the snapshot puts them in."""
+    deck_ids = {deck.get(UUID_FIELD_NAME): deck["id"] for deck in collection.decks.all()}
+    misplaced = set()
+    guids = list(guids)
+    for start in range(0, len(guids), GUID_CHUNK_SIZE):
+        chunk = guids[start:start + GUID_CHUNK_SIZE]
+        for guid, deck_id in collection.db.all(
+                f"select n.guid, (case when c.odid then c.odid else c.did end) from cards c "
+                f"join notes n on c.nid = n.id where n.guid in ({','.join('?' * len(chunk))})", *chunk):
+            if deck_ids.get(snapshot.notes[guid][0]) != deck_id:
+                misplaced.add(guid)
+    return set(guids) - misplaced
+
+
+def unchanged_guids(snapshot: SubscriptionSnapshot, fingerprint: str, collection, check_decks=True) -> Set[str]:
+    """
+    Guids of notes that are exactly as they were last applied (same content and deck), were
+    not edited locally since, and were applied with the same import settings. Writing them
+    again would not change anything. Moving cards doesn't touch their note, so with `check_decks`
+    (the import moves cards back into their deck) notes with cards in another deck are not skipped.
+    """
+    with _lock:
+        try:
+            connection = _connect(cache_file_for(collection))
+        except (OSError, sqlite3.Error) as error:
+            print(f"[AnkiCollab] Could not open the subscription cache: {error}")
+            return set()
+        try:
+            row = connection.execute(
+                "select applied_at, config_fingerprint from subscriptions where deck_hash = ?",
+                (snapshot.deck_hash,)).fetchone()
+            if row is None or row[1] != fingerprint:
+                return set()
+            applied_at = row[0]
+            stored_hashes = dict(connection.execute(
+                "select guid, hash from notes where deck_hash = ?", (snapshot.deck_hash,)))
+        finally:
+            connection.close()
+
+    candidates = {guid for guid, (_, content_hash, _) in snapshot.notes.items()
+                  if stored_hashes.get(guid) == content_hash}
+    if not candidates:
+        return set()
+    unmodified = _locally_unmodified(collection, candidates, applied_at)
+    return _in_their_decks(collection, snapshot, unmodified) if check_decks and unmodified else unmodified
+
+
+def store(cache_file: Path, snapshot: SubscriptionSnapshot, fingerprint: str, applied_at: int) -> None:
+    """Remember the snapshot as the last applied payload of its subscription."""
+    with _lock:
+        try:
+            connection = _connect(cache_file)
+        except (OSError, sqlite3.Error) as error:
+            print(f"[AnkiCollab] Could not open the subscription cache: {error}")
+            return
+        try:
+            with connection:
+                connection.execute("delete from notes where deck_hash = ?", (snapshot.deck_hash,))
+                connection.executemany(
+                    "insert into notes (deck_hash, guid, deck_uuid, position, hash, payload) values (?, ?, ?, ?, ?, ?)",
+                    ((snapshot.deck_hash, guid, deck_uuid, position, content_hash, payload)
+                     for position, (guid, (deck_uuid, content_hash, payload)) in enumerate(snapshot.notes.items())))
+                connection.execute(
+                    "insert or replace into subscriptions (deck_hash, applied_at, config_fingerprint, skeleton, fetched_at) "
+                    "values (?, ?, ?, ?, ?)",
+                    (snapshot.deck_hash, applied_at, fingerprint, snapshot.skeleton, snapshot.fetched_at))
+        except sqlite3.Error as error:
+            print(f"[AnkiCollab] Could not update the subscription cache: {error}")
+        finally:
+            connection.close()
+
+
+def load_skeleton(cache_file: Path, deck_hash: str) -> Optional[Tuple[dict, float]]:
+    """The deck tree (without notes) of the last applied payload and when it was fetched, or None if there is none."""
+    with _lock:
+        try:
+            connection = _connect(cache_file)
+        except (OSError, sqlite3.Error):
+            return None
+        try:
+            row = connection.execute(
+                "select skeleton, fetched_at from subscriptions where deck_hash = ?", (deck_hash,)).fetchone()
+        except sqlite3.Error:
+            return None
+        finally:
+            connection.close()
+    if row is None:
+        return None
+    return json.loads(zlib.decompress(row[0])), row[1]
+
+
+def load_payload(cache_file: Path, deck_hash: str) -> Optional[dict]:
+    """Rebuild the last applied deck payload of a subscription, or None if there is none."""
+    with _lock:
+        try:
+            connection = _connect(cache_file)
+        except (OSError, sqlite3.Error):
+            return None
+        try:
+            row = connection.execute(
+                "select skeleton from subscriptions where deck_hash = ?", (deck_hash,)).fetchone()
+            if row is None:
+                return None
+            notes_by_deck = {}
+            for deck_uuid, payload in connection.execute(
+                    "select deck_uuid, payload from notes where deck_hash = ? order by position", (deck_hash,)):
+                notes_by_deck.setdefault(deck_uuid, []).append(json.loads(zlib.decompress(payload)))
+        finally:
+            connection.close()
+
+    def add_notes(deck):
+        deck["notes"] = notes_by_deck.get(deck.get("crowdanki_uuid", ""), [])
+        for child in deck["children"]:
+            add_notes(child)
+        return deck
+
+    return add_notes(json.loads(zlib.decompress(row[0])))
+
+
+def forget(cache_file: Path, deck_hash: str) -> None:
+    with _lock:
+        try:
+            connection = _connect(cache_file)
+        except (OSError, sqlite3.Error):
+            return
+        try:
+            with connection:
+                connection.execute("delete from notes where deck_hash = ?", (deck_hash,))
+                connection.execute("delete from subscriptions where deck_hash = ?", (deck_hash,))
+        finally:
+            connection.close()
@@ -0,0 +1,146 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+from aqt import mw
+
+from .export_manager import get_timestamp
+from .import_manager import handle_pull, remove_nonexistent_decks
+from .thread import run_function_in_thread
+
+PROBE_URL = "https://plugin.ankicollab.com/GetDeckTimestamp/"
+PROBE_TIMEOUT = 10
+PROBE_WORKERS = 8
+
+# A deck that did not change is probed again after BASE_INTERVAL, then twice as late every time, up to MAX_INTERVAL
+BASE_INTERVAL = 30 * 60
+MAX_INTERVAL = 8 * 60 * 60
+
+
+@dataclass
+class DeckProbeState:
+    interval: float = BASE_INTERVAL
+    next_check: float = 0.0
+    etag: Optional[str] = None
+    last_seen: Optional[float] = None
+    # The last probe's answer, taken over as etag and last_seen once the pull of it was imported
+    pending_etag: Optional[str] = None
+    pending_timestamp: Optional[float] = None
+
+
+class UpdateChecker:
+    """
+    Polls the cheap per-deck timestamp endpoint in the background and only pulls
+    the subscriptions whose remote deck changed since we last saw it.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        """(Re)start checking, e.g. after a profile was opened. Must be called on the main thread."""
+        with self.lock:
+            self.generation += 1
+            self.states = {}
+            generation = self.generation
+        run_function_in_thread(self.check, generation, True)
+
+    def _schedule(self, generation, delay):
+        mw.progress.timer(
+            int(delay * 1000),
+            lambda: run_function_in_thread(self.check, generation, False),
+            False,
+        )
+
+    def _state(self, deck_hash):
+        with self.lock:
+            return self.states.setdefault(deck_hash, DeckProbeState())
+
+    def probe(self, deck_hash) -> Optional[bool]:
+        """
+        Return True if the remote deck changed since it was last seen (or last pulled), False if it
+        did not, and None if the server could not tell (network or server error).
+        """
+        state = self._state(deck_hash)
+        headers = {"If-None-Match": state.etag} if state.etag else {}
+        try:
+            response = requests.get(PROBE_URL + deck_hash, headers=headers, timeout=PROBE_TIMEOUT)
+        except requests.RequestException as error:
+            print(f"[AnkiCollab] Update check for {deck_hash} failed: {error}")
+            return None
+
+        if response.status_code == 304:  # Not Modified
+            return False
+        if response.status_code != 200:
+            return None
+
+        try:
+            remote_timestamp = float(response.text)
+        except ValueError:
+            return None
+
+        state.pending_etag = response.headers.get("ETag")
+        state.pending_timestamp = remote_timestamp
+        last_seen = state.last_seen
+        if last_seen is None:
+            last_seen = get_timestamp(deck_hash) or 0.0
+        if remote_timestamp > last_seen:
+            return True
+        state.etag = state.pending_etag
+        return False
+
+    def _on_imported(self, deck_hash):
+        state = self._state(deck_hash)
+        if state.pending_timestamp is not None:
+            state.last_seen = state.pending_timestamp
+            state.etag = state.pending_etag
+
+    def check(self, generation, startup):
+        if generation != self.generation:
+            return
+        deck_hashes = []
+        completed = False
+        try:
+            if startup:
+                remove_nonexistent_decks()
+
+            strings_data = mw.addonManager.getConfig(__name__)
+            deck_hashes = [deck_hash for deck_hash in (strings_data or {}) if deck_hash != "settings"]
+
+            now = time.time()
+            due = [deck_hash for deck_hash in deck_hashes if self._state(deck_hash).next_check <= now]
+            if due:
+                with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+                    changed = dict(zip(due, executor.map(self.probe, due)))
+
+                now = time.time()
+                for deck_hash, has_changed in changed.items():
+                    state = self._state(deck_hash)
+                    if has_changed:
+                        state.interval = BASE_INTERVAL
+                    state.next_check = now + state.interval
+                    # Only a "no changes" answer backs off, a failed probe is retried after the same interval
+                    if has_changed is False:
+                        state.interval = min(state.interval * 2, MAX_INTERVAL)
+
+                changed_hashes = [deck_hash for deck_hash, has_changed in changed.items() if has_changed]
+                if changed_hashes and generation == self.generation:
+                    handle_pull(None, deck_hashes=changed_hashes, quiet=True, on_imported=self._on_imported)
+            completed = True
+        finally:
+            # Also after an error (e.g. offline at startup), or update checks would stop until Anki restarts
+            next_checks = [self._state(deck_hash).next_check for deck_hash in deck_hashes]
+            delay = max(min(next_checks) - time.time(), 0) if next_checks else BASE_INTERVAL
+            if not completed:
+                # Decks that were due may not have been rescheduled, don't retry them right away
+                delay = max(delay, BASE_INTERVAL)
+            mw.taskman.run_on_main(lambda: self._schedule(generation, delay))
+
+
+update_checker = UpdateChecker()
@@ -0,0 +1,31 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BENCHMARKS_DIR = REPO_ROOT.joinpath("benchmarks")
+
+
+def load_standalone(name):
+    """Load a plugin_source module that has no relative imports, without importing the add-on package."""
+    module_name = f"standalone_{name}"
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, REPO_ROOT.joinpath("plugin_source", f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name]
+
+
+@pytest.fixture(scope="session")
+def fake_aqt():
+    """The stub aqt of benchmarks/, for tests that import add-on modules. Needs the anki package."""
+    pytest.importorskip("anki")
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+    import fake_aqt
+    if not getattr(fake_aqt, "installed", False):
+        fake_aqt.install()
+        fake_aqt.installed = True
+    return fake_aqt
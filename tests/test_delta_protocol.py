@@ -0,0 +1,174 @@
+import copy
+
+import pytest
+
+from conftest import load_standalone
+
+delta_protocol = load_standalone("delta_protocol")
+
+
+def note(guid, text="front"):
+    return {"guid": guid, "fields": [text, "back"], "note_model_uuid": "model-1"}
+
+
+@pytest.fixture
+def base_payload():
+    return {
+        "crowdanki_uuid": "root",
+        "name": "Root",
+        "note_models": [{"crowdanki_uuid": "model-1", "name": "Basic"}],
+        "deck_configurations": [{"crowdanki_uuid": "config-1", "new": 20}],
+        "notes": [note("a"), note("b")],
+        "children": [
+            {"crowdanki_uuid": "child", "name": "Root::Child", "notes": [note("c")], "children": []},
+        ],
+    }
+
+
+def make_delta(**changes):
+    return {"version": delta_protocol.DELTA_VERSION, **changes}
+
+
+def notes_of(deck):
+    return [(entry["guid"], entry["fields"][0]) for entry in deck["notes"]]
+
+
+def test_add_modify_remove(base_payload):
+    original = copy.deepcopy(base_payload)
+    result = delta_protocol.apply_delta(base_payload, make_delta(
+        added=[{"deck_uuid": "child", "note": note("d")}],
+        modified=[{"deck_uuid": "root", "note": note("a", "changed")}],
+        removed=["b"],
+    ))
+
+    assert notes_of(result) == [("a", "changed")]
+    assert notes_of(result["children"][0]) == [("c", "front"), ("d", "front")]
+    # The base payload is the cache, it has to stay as it was
+    assert base_payload == original
+
+
+def test_modified_note_moves_deck(base_payload):
+    result = delta_protocol.apply_delta(base_payload, make_delta(
+        modified=[{"deck_uuid": "child", "note": note("a")}],
+    ))
+
+    assert notes_of(result) == [("b", "front")]
+    assert notes_of(result["children"][0]) == [("a", "front"), ("c", "front")]
+
+
+def test_models_and_configs_are_replaced(base_payload):
+    result = delta_protocol.apply_delta(base_payload, make_delta(
+        note_models=[{"crowdanki_uuid": "model-1", "name": "Basic v2"}, {"crowdanki_uuid": "model-2", "name": "Cloze"}],
+        deck_configurations=[{"crowdanki_uuid": "config-1", "new": 50}],
+    ))
+
+    assert result["note_models"] == [
+        {"crowdanki_uuid": "model-1", "name": "Basic v2"},
+        {"crowdanki_uuid": "model-2", "name": "Cloze"},
+    ]
+    assert result["deck_configurations"] == [{"crowdanki_uuid": "config-1", "new": 50}]
+    assert "note_models" not in result["children"][0]
+
+
+def test_deck_tree_swap(base_payload):
+    result = delta_protocol.apply_delta(base_payload, make_delta(deck={
+        "crowdanki_uuid": "root",
+        "name": "Renamed",
+        "children": [{
+            "crowdanki_uuid": "group",
+            "name": "Renamed::Group",
+            "children": [{"crowdanki_uuid": "child", "name": "Renamed::Group::Child", "children": []}],
+        }],
+    }))
+
+    assert result["name"] == "Renamed"
+    assert notes_of(result) == [("a", "front"), ("b", "front")]
+    group = result["children"][0]
+    assert group["name"] == "Renamed::Group" and group["notes"] == []
+    assert group["children"][0]["name"] == "Renamed::Group::Child"
+    assert notes_of(group["children"][0]) == [("c", "front")]
+    # Models and configurations are kept from the cache unless the delta replaces them
+    assert result["note_models"] == base_payload["note_models"]
+    assert result["deck_configurations"] == base_payload["deck_configurations"]
+
+
+@pytest.mark.parametrize("delta", [
+    make_delta(added=[{"deck_uuid": "unknown", "note": note("d")}]),
+    # The child deck is gone from the new tree, but its note was not removed
+    make_delta(deck={"crowdanki_uuid": "root", "name": "Root", "children": []}),
+    {"version": delta_protocol.DELTA_VERSION + 1},
+])
+def test_delta_that_does_not_fit(base_payload, delta):
+    with pytest.raises(delta_protocol.DeltaError):
+        delta_protocol.apply_delta(base_payload, delta)
+
+
+def test_request_details_without_cache():
+    details = {"timestamp": 1}
+    assert delta_protocol.request_details(details, None, None) is details
+
+
+def test_request_details_fingerprints_the_cache(base_payload):
+    requested = delta_protocol.request_details({"timestamp": 1}, base_payload, 10_000)
+
+    assert requested["timestamp"] == 1
+    assert requested["delta"]["since"] == 10_000 - delta_protocol.CLOCK_MARGIN
+    assert requested["delta"]["note_models"] == {
+        "model-1": delta_protocol.fingerprint(base_payload["note_models"][0]),
+    }
+    assert set(requested["delta"]["deck_configurations"]) == {"config-1"}
+
+
+@pytest.fixture
+def import_manager(fake_aqt, monkeypatch, base_payload):
+    module = fake_aqt.import_plugin_module("import_manager")
+    cache = module.subscription_cache
+    monkeypatch.setattr(cache, "load_skeleton", lambda cache_file, deck_hash: (base_payload, 10_000))
+    monkeypatch.setattr(cache, "load_payload", lambda cache_file, deck_hash: copy.deepcopy(base_payload))
+    monkeypatch.setattr(cache, "take_snapshot", lambda deck_hash, deck, fetched_at: "snapshot")
+    return module
+
+
+def serve(monkeypatch, import_manager, *responses):
+    """Answer the pull requests with `responses`, one per request. Returns the requested details."""
+    requests = []
+    pending = list(responses)
+
+    def pull_changes(deck_hash, details):
+        requests.append(details)
+        return pending.pop(0)
+
+    monkeypatch.setattr(import_manager, "_pull_changes", pull_changes)
+    return requests
+
+
+def test_applies_a_fitting_delta(monkeypatch, import_manager):
+    requests = serve(monkeypatch, import_manager, [
+        {"deck_hash": "hash", "delta": make_delta(removed=["a"])},
+    ])
+
+    result = import_manager.fetch_subscription_update("hash", {"timestamp": 1}, cache_file="cache")
+
+    assert len(requests) == 1 and "delta" in requests[0]
+    assert notes_of(result[0]["deck"]) == [("b", "front")]
+    assert "delta" not in result[0]
+    assert result[0]["cache_snapshot"] == "snapshot"
+
+
+def test_falls_back_to_a_full_pull(monkeypatch, import_manager):
+    full_deck = {"crowdanki_uuid": "root", "name": "Root", "notes": [note("z")], "children": []}
+    requests = serve(monkeypatch, import_manager,
+                     [{"deck_hash": "hash", "delta": make_delta(added=[{"deck_uuid": "unknown", "note": note("d")}])}],
+                     [{"deck_hash": "hash", "deck": full_deck}])
+
+    result = import_manager.fetch_subscription_update("hash", {"timestamp": 1}, cache_file="cache")
+
+    assert [("delta" in details) for details in requests] == [True, False]
+    assert requests[1] == {"timestamp": 1}
+    assert result == [{"deck_hash": "hash", "deck": full_deck, "cache_snapshot": "snapshot"}]
+
+
+def test_failed_full_pull_after_a_bad_delta(monkeypatch, import_manager):
+    serve(monkeypatch, import_manager, [{"deck_hash": "hash", "delta": {"version": 0}}], None)
+
+    assert import_manager.fetch_subscription_update("hash", {"timestamp": 1}, cache_file="cache") is None
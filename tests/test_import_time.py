@@ -0,0 +1,47 @@
+import re
+import subprocess
+import sys
+
+import pytest
+
+from conftest import BENCHMARKS_DIR
+
+# Loading the add-on (main.py, menus and hooks) takes about 0.2s without the Google Drive client
+IMPORT_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ("googleapiclient", "google.oauth2")
+
+IMPORT_ADDON = """
+import fake_aqt
+fake_aqt.install(bare_package=False)
+import plugin_source
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    """Module name -> cumulative import time in seconds, of importing the add-on with the stub aqt."""
+    pytest.importorskip("anki")
+    pytest.importorskip("sentry_sdk")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_ADDON],
+        cwd=str(BENCHMARKS_DIR), capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1_000_000
+    return times
+
+
+def test_google_client_is_not_imported(import_times):
+    loaded = [name for name in import_times
+              if any(name == module or name.startswith(module + ".") for module in LAZY_MODULES)]
+    assert loaded == []
+
+
+def test_import_time_budget(import_times):
+    assert import_times["plugin_source"] <= IMPORT_BUDGET_SECONDS
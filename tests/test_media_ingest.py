@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def media_ingest(fake_aqt):
+    return fake_aqt.import_plugin_module("media_ingest")
+
+
+def write(path, data, mtime_ns=1_700_000_000_000_000_000):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_same_size_and_second_is_not_same_content(media_ingest, tmp_path):
+    src = write(tmp_path.joinpath("src.png"), b"new image", mtime_ns=1_700_000_000_500_000_000)
+    dst = write(tmp_path.joinpath("dst.png"), b"old image", mtime_ns=1_700_000_000_000_000_000)
+
+    assert not media_ingest.same_content(src, dst)
+
+
+def test_same_size_and_mtime_is_not_read(media_ingest, tmp_path, monkeypatch):
+    src = write(tmp_path.joinpath("src.png"), b"image")
+    dst = write(tmp_path.joinpath("dst.png"), b"image")
+
+    def unexpected_hash(path):
+        raise AssertionError(f"{path} was hashed")
+
+    monkeypatch.setattr(media_ingest, "file_hash", unexpected_hash)
+    assert media_ingest.same_content(src, dst)
+
+
+def test_copied_file_is_same_content(media_ingest, tmp_path):
+    src = write(tmp_path.joinpath("src.png"), b"image")
+    dst = str(tmp_path.joinpath("dst.png"))
+    media_ingest.MediaCopier(allow_reflinks=False).copy(src, dst)
+
+    assert os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+    assert media_ingest.same_content(src, dst)
+
+
+def test_identical_files_are_same_content(media_ingest, tmp_path):
+    src = write(tmp_path.joinpath("src.png"), b"image", mtime_ns=1_000_000_000)
+    dst = write(tmp_path.joinpath("dst.png"), b"image", mtime_ns=2_000_000_000)
+
+    assert media_ingest.same_content(src, dst)
+
+
+@pytest.mark.parametrize("allow_hardlinks", [False, True])
+def test_copy_replaces_the_destination(media_ingest, tmp_path, allow_hardlinks):
+    src = write(tmp_path.joinpath("src.png"), b"new image")
+    dst = write(tmp_path.joinpath("dst.png"), b"old")
+
+    media_ingest.MediaCopier(allow_hardlinks=allow_hardlinks, allow_reflinks=False).copy(src, dst)
+
+    assert tmp_path.joinpath("dst.png").read_bytes() == b"new image"
+    assert sorted(os.listdir(tmp_path)) == ["dst.png", "src.png"]
+
+
+def test_failed_copy_keeps_the_destination(media_ingest, tmp_path, monkeypatch):
+    src = write(tmp_path.joinpath("src.png"), b"new image")
+    dst = write(tmp_path.joinpath("dst.png"), b"old image")
+
+    def interrupted_copy(src, dst):
+        with open(dst, "wb") as file:
+            file.write(b"new")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(media_ingest.shutil, "copy2", interrupted_copy)
+    with pytest.raises(OSError):
+        media_ingest.MediaCopier(allow_reflinks=False).copy(src, dst)
+
+    assert tmp_path.joinpath("dst.png").read_bytes() == b"old image"
+    assert sorted(os.listdir(tmp_path)) == ["dst.png", "src.png"]
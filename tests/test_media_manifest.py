@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+
+def _manifest(fake_aqt, tmp_path, monkeypatch):
+    media_manifest = fake_aqt.import_plugin_module("media_manifest")
+    monkeypatch.setattr(media_manifest, "MANIFEST_DIR", tmp_path.joinpath("manifests"))
+    media_dir = tmp_path.joinpath("media")
+    media_dir.mkdir()
+    return media_manifest.MediaManifest("deck", str(media_dir)), media_dir
+
+
+@pytest.mark.parametrize("direct_stat_limit", [0, 256])
+def test_deleted_files_are_missing_again(fake_aqt, tmp_path, monkeypatch, direct_stat_limit):
+    manifest, media_dir = _manifest(fake_aqt, tmp_path, monkeypatch)
+    monkeypatch.setattr(fake_aqt.import_plugin_module("media_manifest"), "DIRECT_STAT_LIMIT", direct_stat_limit)
+    media_dir.joinpath("a.png").write_bytes(b"a")
+    media_dir.joinpath("b.png").write_bytes(b"b")
+    manifest.record({"a.png": None, "b.png": None})
+    assert manifest.missing(["a.png", "b.png"]) == set()
+
+    os.remove(media_dir.joinpath("a.png"))
+    assert manifest.missing(["a.png", "b.png"]) == {"a.png"}
+    assert "a.png" not in manifest.entries
+
+
+def test_changed_files_lose_their_hash(fake_aqt, tmp_path, monkeypatch):
+    manifest, media_dir = _manifest(fake_aqt, tmp_path, monkeypatch)
+    media_dir.joinpath("a.png").write_bytes(b"a")
+    manifest.record({"a.png": None})
+    assert manifest.entries["a.png"].md5 is not None
+
+    media_dir.joinpath("a.png").write_bytes(b"changed")
+    assert manifest.present(["a.png"]) == {"a.png"}
+    assert manifest.entries["a.png"].md5 is None
+    assert manifest.entries["a.png"].size == len(b"changed")
+
+
+def test_verify_treats_damaged_files_as_missing(fake_aqt, tmp_path, monkeypatch):
+    manifest, media_dir = _manifest(fake_aqt, tmp_path, monkeypatch)
+    media_dir.joinpath("a.png").write_bytes(b"a")
+    manifest.record({"a.png": None})
+    stat = os.stat(media_dir.joinpath("a.png"))
+
+    media_dir.joinpath("a.png").write_bytes(b"b")
+    os.utime(media_dir.joinpath("a.png"), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert manifest.missing(["a.png"]) == set()
+    assert manifest.missing(["a.png"], verify=True) == {"a.png"}
@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import load_standalone
+
+media_references = load_standalone("media_references")
+
+
+@pytest.mark.parametrize("css, expected", [
+    ('@import "_a.css";', ["_a.css"]),
+    ("@import '_b.css';", ["_b.css"]),
+    ('@IMPORT "_c.css";', ["_c.css"]),
+    ('@import "plain.css";', []),
+    ('url("_font.woff")', ["_font.woff"]),
+    ("url('_f2.ttf')", ["_f2.ttf"]),
+    ('url( "_sp.png" )', ["_sp.png"]),
+    ("url(_f3.png)", ["_f3.png"]),
+    ("URL(_up.png)", ["_up.png"]),
+    ("url(plain.png)", []),
+])
+def test_gather_media_from_css(css, expected):
+    assert media_references.gather_media_from_css(css) == expected
+
+
+@pytest.mark.parametrize("template_side, expected", [
+    ('<img src="_a.png">', ["_a.png"]),
+    ("<img src=_b.png>", ["_b.png"]),
+    ("<img src=_g.png alt=x>", ["_g.png"]),
+    # Like Anki, unquoted attributes only match lowercase src/data; quoted values match anywhere
+    ("<img SRC=_c.png>", []),
+    ('<img SRC="_q.png">', ["_q.png"]),
+    ("<script src='_e.js'></script>", ["_e.js"]),
+    ("<object data=_f.svg>", ["_f.svg"]),
+    ("[sound:_d.mp3]", ["_d.mp3"]),
+    ("[sound:plain.mp3]", []),
+    ('<img src="plain.png">', []),
+])
+def test_gather_media_from_template_side(template_side, expected):
+    assert media_references.gather_media_from_template_side(template_side) == expected
+
+
+def _notetype(css, qfmt):
+    return {"id": 1234, "mod": 1, "css": css, "tmpls": [{"qfmt": qfmt, "afmt": "{{FrontSide}}"}]}
+
+
+def test_notetype_media_follows_changes_with_the_same_mod():
+    assert media_references.get_notetype_media(_notetype("", '<img src="_old.png">')) == ["_old.png"]
+    # Updates that keep id and mod must not serve the old result
+    assert media_references.get_notetype_media(_notetype("url(_font.ttf)", '<img src="_new.png">')) == \
+        ["_font.ttf", "_new.png"]
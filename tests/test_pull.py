@@ -0,0 +1,56 @@
+import base64
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+def encode(payload):
+    return base64.b64encode(gzip.compress(json.dumps(payload).encode("utf8")))
+
+
+@pytest.fixture
+def import_manager(fake_aqt, monkeypatch, tmp_path):
+    module = fake_aqt.import_plugin_module("import_manager")
+    config = {"settings": {}, "good": {"timestamp": 0}, "broken": {"timestamp": 0}}
+    monkeypatch.setattr(fake_aqt.fake_mw.addonManager, "getConfig", lambda _name: config)
+    monkeypatch.setattr(fake_aqt.fake_mw, "create_backup_now", lambda: None, raising=False)
+    monkeypatch.setattr(module.subscription_cache, "cache_file_for", lambda collection: tmp_path.joinpath("cache.sqlite"))
+    return module
+
+
+def test_broken_payload_does_not_stop_the_other_subscriptions(import_manager, monkeypatch):
+    responses = {
+        "good": encode([{"deck_hash": "good", "deck": {"crowdanki_uuid": "root", "notes": [], "children": []}}]),
+        "broken": b"this is not a gzipped payload",
+    }
+
+    def post(url, json):
+        (deck_hash,) = json
+        return SimpleNamespace(status_code=200, content=responses[deck_hash])
+
+    imported = []
+
+    def import_subscription(subscription, input_hash, on_done=None):
+        imported.append(subscription["deck_hash"])
+        on_done(True)
+
+    finished = []
+    monkeypatch.setattr(import_manager.requests, "post", post)
+    monkeypatch.setattr(import_manager, "import_subscription", import_subscription)
+    original_finish = import_manager.SubscriptionImportQueue.finish
+
+    def finish(queue, failed_count=0):
+        finished.append(failed_count)
+        original_finish(queue, failed_count)
+
+    monkeypatch.setattr(import_manager.SubscriptionImportQueue, "finish", finish)
+
+    import_manager.handle_pull(None, quiet=True)
+
+    assert imported == ["good"]
+    assert finished == [1]
+    # The pull is over, so the next one may start
+    assert import_manager._start_pull()
+    import_manager._pull_finished()
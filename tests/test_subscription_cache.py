@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def subscription_cache(fake_aqt, monkeypatch, tmp_path):
+    module = fake_aqt.import_plugin_module("subscription_cache")
+    monkeypatch.setattr(module, "cache_file_for", lambda collection: tmp_path.joinpath("cache.sqlite"))
+    return module
+
+
+@pytest.fixture
+def collection(fake_aqt, tmp_path):
+    from anki.collection import Collection
+    collection = Collection(str(tmp_path.joinpath("collection.anki2")))
+    yield collection
+    collection.close()
+
+
+def add_deck(collection, name, uuid):
+    deck_id = collection.decks.id(name)
+    deck = collection.decks.get(deck_id)
+    deck["crowdanki_uuid"] = uuid
+    collection.decks.save(deck)
+    return deck_id
+
+
+@pytest.fixture
+def applied_note(subscription_cache, collection):
+    """A note as applied by the last pull, and the snapshot of that pull."""
+    deck_id = add_deck(collection, "Subscribed", "deck-uuid")
+    note = collection.new_note(collection.models.by_name("Basic"))
+    note["Front"] = "front"
+    collection.add_note(note, deck_id)
+
+    payload = {"crowdanki_uuid": "deck-uuid", "notes": [{"guid": note.guid, "fields": ["front", ""]}], "children": []}
+    snapshot = subscription_cache.take_snapshot("hash", payload)
+    fingerprint = subscription_cache.config_fingerprint({}, [], False, False)
+    subscription_cache.store(subscription_cache.cache_file_for(collection), snapshot, fingerprint, int(time.time()) + 1)
+    return note, snapshot, fingerprint
+
+
+def test_unchanged_note_is_skipped(subscription_cache, collection, applied_note):
+    note, snapshot, fingerprint = applied_note
+
+    assert subscription_cache.unchanged_guids(snapshot, fingerprint, collection) == {note.guid}
+
+
+def test_moved_cards_are_not_skipped(subscription_cache, collection, applied_note):
+    note, snapshot, fingerprint = applied_note
+    collection.set_deck(note.card_ids(), add_deck(collection, "Elsewhere", "other-uuid"))
+
+    assert subscription_cache.unchanged_guids(snapshot, fingerprint, collection) == set()
+    # Unless the import leaves the cards where they are anyway
+    assert subscription_cache.unchanged_guids(snapshot, fingerprint, collection, check_decks=False) == {note.guid}
+
+
+def test_other_import_settings_are_not_trusted(subscription_cache, collection, applied_note):
+    note, snapshot, _ = applied_note
+    fingerprint = subscription_cache.config_fingerprint({}, [], False, True)
+
+    assert subscription_cache.unchanged_guids(snapshot, fingerprint, collection) == set()
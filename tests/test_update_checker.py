@@ -0,0 +1,57 @@
+import pytest
+
+
+@pytest.fixture
+def update_checker(fake_aqt, monkeypatch):
+    module = fake_aqt.import_plugin_module("update_checker")
+    config = {"settings": {}, "deck": {"timestamp": 0}}
+    monkeypatch.setattr(fake_aqt.fake_mw.addonManager, "getConfig", lambda _name: config)
+    monkeypatch.setattr(module, "remove_nonexistent_decks", lambda: None)
+    monkeypatch.setattr(module, "handle_pull", lambda *args, **kwargs: None)
+    return module
+
+
+@pytest.fixture
+def checker(update_checker, monkeypatch):
+    checker = update_checker.UpdateChecker()
+    checker.scheduled = []
+    monkeypatch.setattr(checker, "_schedule", lambda generation, delay: checker.scheduled.append(delay))
+    return checker
+
+
+def test_next_check_is_scheduled_after_an_error(update_checker, checker, monkeypatch):
+    def offline():
+        raise OSError("offline")
+
+    monkeypatch.setattr(update_checker, "remove_nonexistent_decks", offline)
+    with pytest.raises(OSError):
+        checker.check(checker.generation, True)
+
+    assert checker.scheduled == [update_checker.BASE_INTERVAL]
+
+
+def test_next_check_is_scheduled_after_a_failed_pull(update_checker, checker, monkeypatch):
+    def broken_pull(*args, **kwargs):
+        raise ValueError("bad response")
+
+    monkeypatch.setattr(checker, "probe", lambda deck_hash: True)
+    monkeypatch.setattr(update_checker, "handle_pull", broken_pull)
+    with pytest.raises(ValueError):
+        checker.check(checker.generation, False)
+
+    assert len(checker.scheduled) == 1
+
+
+@pytest.mark.parametrize("answer, next_interval", [
+    (False, 2),  # no changes: back off
+    (None, 1),  # the probe failed: try again after the same interval
+    (True, 1),
+])
+def test_backoff(update_checker, checker, monkeypatch, answer, next_interval):
+    monkeypatch.setattr(checker, "probe", lambda deck_hash: answer)
+    checker.check(checker.generation, False)
+
+    state = checker.states["deck"]
+    assert state.interval == next_interval * update_checker.BASE_INTERVAL
+    # The first check after this one is BASE_INTERVAL away in every case
+    assert checker.scheduled[0] == pytest.approx(update_checker.BASE_INTERVAL, abs=5)